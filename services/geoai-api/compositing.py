@@ -0,0 +1,424 @@
+"""Streaming cloud-masked temporal compositing.
+
+Scenes are read one block at a time and folded into per-block online
+reductions, so memory depends on the block size and never on the number of
+acquisitions in the date range.
+"""
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import uuid
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import Affine, from_origin
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+
+from geometry import WGS84, get_transformer
+
+logger = logging.getLogger(__name__)
+
+# Days between acquisitions of the same spot, used by the synthetic catalogue
+REVISIT_DAYS = {
+    "sentinel-2": 5,
+    "landsat-8": 16,
+    "sentinel-1": 6
+}
+
+# Histogram bins per band for the median composite (reflectance step of 0.01)
+MEDIAN_BINS = 100
+
+# Up to this many scenes the median is exact over a stacked block; beyond it histograms bound memory
+MEDIAN_STACK_MAX_SCENES = 16
+
+# Pixels per slice when turning median histograms into values
+MEDIAN_RESULT_CHUNK = 4096
+
+# Scenes are grouped into fixed periods whose max-NDVI composites are cached and merged
+MAX_NDVI_PERIOD_DAYS = 16
+
+# (red, nir) band names for the max-NDVI composite
+NDVI_BANDS = {
+    "sentinel-2": ("B4", "B8"),
+    "landsat-8": ("B4", "B5")
+}
+
+
+@dataclass
+class CompositeGrid:
+    crs: str
+    transform: Affine
+    width: int
+    height: int
+
+    def windows(self, block_size: int) -> Iterator[Window]:
+        for row in range(0, self.height, block_size):
+            for col in range(0, self.width, block_size):
+                yield Window(col, row, min(block_size, self.width - col), min(block_size, self.height - row))
+
+    def signature(self) -> str:
+        """Identifies the grid in cache keys"""
+        return f"{self.crs}|{tuple(self.transform)[:6]}|{self.width}x{self.height}"
+
+
+@dataclass
+class Scene:
+    """One acquisition; ``path`` is None for synthetic development scenes"""
+    scene_id: str
+    acquisition_date: str
+    cloud_cover: float
+    bands: List[str]
+    path: Optional[str] = None
+    # Reflectance = stored value * scale + offset (uploads store raw DNs)
+    scale: float = 1.0
+    offset: float = 0.0
+
+    def read_block(self, grid: CompositeGrid, window: Window, vrt: Optional[WarpedVRT] = None) -> np.ndarray:
+        """Return a (bands, rows, cols) float32 reflectance block with clouds/nodata as NaN.
+
+        ``vrt`` is this scene's grid-aligned WarpedVRT from a ``SceneReader``;
+        without one the file is opened and warped for this block alone.
+        """
+        if self.path is None:
+            return self._synthetic_block(window)
+        if vrt is None:
+            with SceneReader(grid) as reader:
+                return reader.read(self, window)
+        block = vrt.read(window=window, masked=True).astype(np.float32).filled(np.nan)
+        if self.scale != 1.0 or self.offset != 0.0:
+            block *= np.float32(self.scale)
+            block += np.float32(self.offset)
+        return block
+
+    def _synthetic_block(self, window: Window) -> np.ndarray:
+        seed_text = f"{self.scene_id}:{window.row_off}:{window.col_off}"
+        rng = np.random.default_rng(int(hashlib.sha1(seed_text.encode()).hexdigest()[:12], 16))
+        shape = (len(self.bands), int(window.height), int(window.width))
+        block = rng.uniform(0.02, 0.45, size=shape).astype(np.float32)
+        clouds = rng.random(shape[1:]) < self.cloud_cover
+        block[:, clouds] = np.nan
+        return block
+
+
+class SceneReader:
+    """Keeps each scene's dataset and grid-aligned WarpedVRT open for one pass.
+
+    Opening the file and setting up the warp (CRS transform and source window
+    mapping) happens once per scene rather than once per scene and block.
+    """
+
+    def __init__(self, grid: CompositeGrid):
+        self.grid = grid
+        self._stack = ExitStack()
+        self._vrts: Dict[str, WarpedVRT] = {}
+
+    def __enter__(self) -> "SceneReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._vrts.clear()
+        self._stack.close()
+
+    def read(self, scene: Scene, window: Window) -> np.ndarray:
+        if scene.path is None:
+            return scene.read_block(self.grid, window)
+        vrt = self._vrts.get(scene.path)
+        if vrt is None:
+            src = self._stack.enter_context(rasterio.open(scene.path))
+            vrt = self._stack.enter_context(WarpedVRT(
+                src, crs=CRS.from_user_input(self.grid.crs), transform=self.grid.transform,
+                width=self.grid.width, height=self.grid.height
+            ))
+            self._vrts[scene.path] = vrt
+        return scene.read_block(self.grid, window, vrt)
+
+
+def build_composite_grid(bbox: Dict[str, Any], resolution_m: float) -> CompositeGrid:
+    """Square-pixel grid over the bbox in its UTM zone"""
+    crs = f"EPSG:{bbox['utm_epsg']}"
+    xs, ys = get_transformer(WGS84, crs).transform(
+        [bbox["min_lon"], bbox["max_lon"], bbox["max_lon"], bbox["min_lon"]],
+        [bbox["min_lat"], bbox["min_lat"], bbox["max_lat"], bbox["max_lat"]]
+    )
+    left, right, bottom, top = float(min(xs)), float(max(xs)), float(min(ys)), float(max(ys))
+    width = max(1, int(np.ceil((right - left) / resolution_m)))
+    height = max(1, int(np.ceil((top - bottom) / resolution_m)))
+    return CompositeGrid(crs, from_origin(left, top, resolution_m, resolution_m), width, height)
+
+
+def list_scenes(bbox: Dict[str, Any], start_date: str, end_date: str, satellite_source: str,
+                bands: List[str]) -> List[Scene]:
+    """List acquisitions in the date range.
+
+    Development catalogue: one synthetic scene per revisit interval. In
+    production this would query Sentinel Hub / Earth Engine for scene metadata.
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    step = timedelta(days=REVISIT_DAYS.get(satellite_source, 5))
+    location = f"{bbox['min_lat']:.3f},{bbox['min_lon']:.3f}"
+
+    scenes = []
+    day = start
+    while day <= end:
+        scene_id = f"{satellite_source}_{day.strftime('%Y%m%d')}_{location}"
+        rng = np.random.default_rng(int(hashlib.sha1(scene_id.encode()).hexdigest()[:12], 16))
+        scenes.append(Scene(
+            scene_id=scene_id,
+            acquisition_date=day.strftime("%Y-%m-%d"),
+            cloud_cover=float(rng.uniform(0.0, 0.6)),
+            bands=list(bands)
+        ))
+        day += step
+    return scenes
+
+
+def select_scenes(scenes: List[Scene], max_cloud_cover: float) -> Tuple[List[Scene], List[Scene]]:
+    """Split scenes into (used, skipped) by scene-level cloud cover"""
+    used = [scene for scene in scenes if scene.cloud_cover <= max_cloud_cover]
+    skipped = [scene for scene in scenes if scene.cloud_cover > max_cloud_cover]
+    if not used and scenes:
+        # Better a cloudy composite than none; per-pixel masking still applies
+        least_cloudy = min(scenes, key=lambda scene: scene.cloud_cover)
+        logger.warning(
+            f"No scene under {max_cloud_cover:.0%} cloud cover; using {least_cloudy.scene_id} "
+            f"({least_cloudy.cloud_cover:.0%})"
+        )
+        used = [least_cloudy]
+        skipped = [scene for scene in scenes if scene is not least_cloudy]
+    return used, skipped
+
+
+class MaxNDVIReducer:
+    """Keep, per pixel, the band values from the scene with the highest NDVI"""
+
+    def __init__(self, shape: Tuple[int, int, int], red_index: int, nir_index: int):
+        self.best_ndvi = np.full(shape[1:], -np.inf, dtype=np.float32)
+        self.values = np.full(shape, np.nan, dtype=np.float32)
+        self.red_index = red_index
+        self.nir_index = nir_index
+
+    def add(self, block: np.ndarray):
+        red, nir = block[self.red_index], block[self.nir_index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ndvi = (nir - red) / (nir + red)
+        better = np.isfinite(ndvi) & (ndvi > self.best_ndvi)
+        self.best_ndvi[better] = ndvi[better]
+        self.values[:, better] = block[:, better]
+
+    @property
+    def nbytes(self) -> int:
+        return self.best_ndvi.nbytes + self.values.nbytes
+
+    def result(self) -> np.ndarray:
+        return self.values
+
+
+class StackMedianReducer:
+    """Exact per-pixel median of a small scene stack.
+
+    Holds ``scenes x bands x pixels`` float32 values, which for a handful of
+    scenes is far less than the histogram counters and much faster to reduce.
+    """
+
+    def __init__(self, shape: Tuple[int, int, int], scene_count: int):
+        self.stack = np.full((scene_count, shape[0], shape[1] * shape[2]), np.nan, dtype=np.float32)
+        self.shape = shape
+        self.added = 0
+
+    def add(self, block: np.ndarray):
+        self.stack[self.added] = block.reshape(self.shape[0], -1)
+        self.added += 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.stack.nbytes
+
+    def result(self) -> np.ndarray:
+        if self.added == 0:
+            return np.full(self.shape, np.nan, dtype=np.float32)
+        stack = self.stack[:self.added]
+        # In-place sort puts NaN last, so the valid values of each pixel lead its column
+        stack.sort(axis=0)
+        valid = np.count_nonzero(~np.isnan(stack), axis=0)
+        low = np.take_along_axis(stack, (np.maximum(valid - 1, 0) // 2)[None], axis=0)[0]
+        high = np.take_along_axis(stack, np.minimum(valid // 2, len(stack) - 1)[None], axis=0)[0]
+        median = (low + high) * np.float32(0.5)
+        median[valid == 0] = np.nan
+        return median.reshape(self.shape)
+
+
+class MedianReducer:
+    """Per-pixel median via fixed-width reflectance histograms.
+
+    Memory is ``bands x pixels x bins`` counters however many scenes are
+    folded in; the median is interpolated within its bin.
+    """
+
+    def __init__(self, shape: Tuple[int, int, int], bins: int = MEDIAN_BINS, value_range: Tuple[float, float] = (0.0, 1.0)):
+        self.bins = bins
+        self.low, self.high = value_range
+        self.counts = np.zeros((shape[0], shape[1] * shape[2], bins), dtype=np.uint16)
+        self.shape = shape
+
+    def add(self, block: np.ndarray):
+        flat = block.reshape(self.shape[0], -1)
+        valid = np.isfinite(flat)
+        scaled = (np.clip(flat, self.low, self.high) - self.low) / (self.high - self.low)
+        bin_index = np.minimum((np.nan_to_num(scaled) * self.bins).astype(np.int64), self.bins - 1)
+        band_index, pixel_index = np.nonzero(valid)
+        # Each (band, pixel) appears at most once per scene, so plain fancy-index increment is exact
+        self.counts[band_index, pixel_index, bin_index[valid]] += 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes
+
+    def result(self) -> np.ndarray:
+        # Interpolate a slice of pixels at a time so the bins-sized temporaries stay small
+        median = np.empty(self.counts.shape[:2], dtype=np.float32)
+        for start in range(0, self.counts.shape[1], MEDIAN_RESULT_CHUNK):
+            median[:, start:start + MEDIAN_RESULT_CHUNK] = self._median(
+                self.counts[:, start:start + MEDIAN_RESULT_CHUNK]
+            )
+        return median.reshape(self.shape)
+
+    def _median(self, counts: np.ndarray) -> np.ndarray:
+        cumulative = np.cumsum(counts, axis=2, dtype=np.int32)
+        totals = cumulative[:, :, -1]
+        half = totals / 2.0
+        median_bin = np.argmax(cumulative >= half[:, :, None], axis=2)
+        below = np.where(
+            median_bin > 0,
+            np.take_along_axis(cumulative, np.maximum(median_bin - 1, 0)[:, :, None], axis=2)[:, :, 0],
+            0
+        )
+        in_bin = np.take_along_axis(counts, median_bin[:, :, None], axis=2)[:, :, 0]
+        fraction = np.where(in_bin > 0, (half - below) / np.maximum(in_bin, 1), 0.5)
+        width = (self.high - self.low) / self.bins
+        median = self.low + (median_bin + fraction) * width
+        return np.where(totals > 0, median, np.nan).astype(np.float32)
+
+
+def build_composite(scenes: List[Scene], grid: CompositeGrid, bands: List[str], output_path: str,
+                    method: str = "median", satellite_source: str = "sentinel-2", block_size: int = 128,
+                    cancel_check: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Stream scenes block by block into a tiled GeoTIFF composite"""
+    if method not in ("median", "max_ndvi"):
+        raise ValueError(f"Unknown composite method: {method}")
+    if method == "max_ndvi":
+        red_band, nir_band = NDVI_BANDS.get(satellite_source, NDVI_BANDS["sentinel-2"])
+        red_index, nir_index = bands.index(red_band), bands.index(nir_band)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    profile = {
+        "driver": "GTiff",
+        "dtype": "float32",
+        "count": len(bands),
+        "width": grid.width,
+        "height": grid.height,
+        "crs": CRS.from_user_input(grid.crs),
+        "transform": grid.transform,
+        "nodata": np.nan,
+        "tiled": True,
+        "blockxsize": block_size,
+        "blockysize": block_size,
+        "compress": "deflate"
+    }
+
+    valid_pixels = 0
+    total_pixels = grid.width * grid.height
+    with rasterio.open(output_path, "w", **profile) as dst, SceneReader(grid) as reader:
+        for window in grid.windows(block_size):
+            shape = (len(bands), int(window.height), int(window.width))
+            if method == "median" and len(scenes) <= MEDIAN_STACK_MAX_SCENES:
+                reducer = StackMedianReducer(shape, len(scenes))
+            elif method == "median":
+                reducer = MedianReducer(shape)
+            else:
+                reducer = MaxNDVIReducer(shape, red_index, nir_index)
+            for scene in scenes:
+                if cancel_check is not None:
+                    cancel_check()
+                block = reader.read(scene, window)
+                reducer.add(block)
+            composite = reducer.result()
+            valid_pixels += int(np.count_nonzero(np.isfinite(composite[0])))
+            dst.write(composite, window=window)
+            # Free this block's reducer before the next one is allocated, or two would coexist
+            reducer = block = composite = None
+
+    return {
+        "composite_path": output_path,
+        "composite_method": method,
+        "scenes_read": len(scenes),
+        "crs": grid.crs,
+        "width": grid.width,
+        "height": grid.height,
+        "block_size": block_size,
+        "valid_pixel_fraction": valid_pixels / total_pixels if total_pixels else 0.0
+    }
+
+
+def build_incremental_max_ndvi(scenes: List[Scene], grid: CompositeGrid, bands: List[str], output_path: str,
+                               cache_dir: str, satellite_source: str = "sentinel-2", block_size: int = 128,
+                               cancel_check: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Max-NDVI composite merged from cached per-period partial composites.
+
+    Max-NDVI is mergeable: the NDVI of a partial composite's pixel is the best
+    NDVI among its scenes, so partials can be reduced like scenes. Scenes are
+    grouped into aligned ``MAX_NDVI_PERIOD_DAYS`` periods keyed by their scene
+    IDs; a rolling window only reads scenes of periods it has not seen with the
+    same scene set (typically the two at its edges).
+    """
+    periods: Dict[int, List[Scene]] = {}
+    for scene in scenes:
+        ordinal = datetime.strptime(scene.acquisition_date, "%Y-%m-%d").toordinal()
+        periods.setdefault(ordinal // MAX_NDVI_PERIOD_DAYS, []).append(scene)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    partials = []
+    reused = computed = 0
+    for period in sorted(periods):
+        group = periods[period]
+        key_text = "|".join([
+            "max_ndvi", grid.signature(), satellite_source, ",".join(bands),
+            *sorted(scene.scene_id for scene in group)
+        ])
+        path = os.path.join(cache_dir, f"{hashlib.sha1(key_text.encode()).hexdigest()}.tif")
+        if os.path.exists(path):
+            # Refresh the mtime so artifact retention keeps partials still in use
+            os.utime(path)
+            reused += len(group)
+        else:
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            build_composite(group, grid, bands, tmp_path, method="max_ndvi", satellite_source=satellite_source,
+                            block_size=block_size, cancel_check=cancel_check)
+            os.replace(tmp_path, path)
+            computed += len(group)
+        partials.append(Scene(
+            scene_id=f"max_ndvi_period_{period}",
+            acquisition_date=group[-1].acquisition_date,
+            cloud_cover=0.0,
+            bands=list(bands),
+            path=path
+        ))
+
+    composite = build_composite(partials, grid, bands, output_path, method="max_ndvi",
+                                satellite_source=satellite_source, block_size=block_size,
+                                cancel_check=cancel_check)
+    composite.update({
+        "scenes_read": computed,
+        "scenes_reused": reused,
+        "partial_composites": len(partials)
+    })
+    return composite
@@ -0,0 +1,92 @@
+"""Geometry utilities for the GeoAI API: cached CRS transformers, UTM zone
+selection and geodesic bounding boxes and areas for arrays of points/boxes."""
+from functools import lru_cache
+from typing import Any, Dict
+
+import numpy as np
+import pyproj
+
+WGS84 = "EPSG:4326"
+
+# WGS84 ellipsoid used for all geodesic distance calculations
+GEOD = pyproj.Geod(ellps="WGS84")
+
+
+@lru_cache(maxsize=128)
+def get_transformer(src_crs: str, dst_crs: str) -> pyproj.Transformer:
+    """Return a cached lon/lat ordered transformer between two CRS definitions"""
+    return pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def utm_epsg_for(latitude, longitude):
+    """Return the WGS84 UTM zone EPSG code(s) for the given point(s)"""
+    lat = np.asarray(latitude, dtype=np.float64)
+    lon = np.asarray(longitude, dtype=np.float64)
+    zone = (np.floor((lon + 180.0) / 6.0).astype(np.int64) % 60) + 1
+    epsg = np.where(lat >= 0, 32600 + zone, 32700 + zone)
+    return int(epsg) if epsg.ndim == 0 else epsg
+
+
+def create_bounding_boxes(latitudes, longitudes, radius_km) -> Dict[str, np.ndarray]:
+    """Create geodesic bounding boxes around arrays of points.
+
+    Edges are found by walking ``radius_km`` north, south, east and west on the
+    WGS84 ellipsoid, so boxes stay accurate away from the equator. Areas are
+    computed in each point's UTM zone.
+    """
+    lat = np.atleast_1d(np.asarray(latitudes, dtype=np.float64))
+    lon = np.atleast_1d(np.asarray(longitudes, dtype=np.float64))
+    lat, lon = np.broadcast_arrays(lat, lon)
+    dist_m = np.broadcast_to(np.asarray(radius_km, dtype=np.float64) * 1000.0, lat.shape)
+
+    # One vectorized geodesic call per direction for the whole batch
+    _, max_lat, _ = GEOD.fwd(lon, lat, np.zeros_like(lat), dist_m)
+    _, min_lat, _ = GEOD.fwd(lon, lat, np.full_like(lat, 180.0), dist_m)
+    max_lon, _, _ = GEOD.fwd(lon, lat, np.full_like(lat, 90.0), dist_m)
+    min_lon, _, _ = GEOD.fwd(lon, lat, np.full_like(lat, 270.0), dist_m)
+
+    min_lat = np.asarray(min_lat)
+    max_lat = np.asarray(max_lat)
+    min_lon = np.asarray(min_lon)
+    max_lon = np.asarray(max_lon)
+
+    return {
+        "min_lat": min_lat,
+        "max_lat": max_lat,
+        "min_lon": min_lon,
+        "max_lon": max_lon,
+        "utm_epsg": np.atleast_1d(utm_epsg_for(lat, lon)),
+        "area_km2": bbox_areas_km2(min_lon, min_lat, max_lon, max_lat),
+    }
+
+
+def create_bounding_box(lat: float, lon: float, radius_km: float) -> Dict[str, Any]:
+    """Create a geodesic bounding box around a single point"""
+    boxes = create_bounding_boxes(lat, lon, radius_km)
+    return {
+        key: (int(values[0]) if key == "utm_epsg" else float(values[0]))
+        for key, values in boxes.items()
+    }
+
+
+def bbox_areas_km2(min_lon, min_lat, max_lon, max_lat) -> np.ndarray:
+    """Return bounding box areas in km² measured in each box's UTM zone"""
+    min_lon, min_lat, max_lon, max_lat = (
+        np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (min_lon, min_lat, max_lon, max_lat)
+    )
+    epsg = np.atleast_1d(utm_epsg_for((min_lat + max_lat) / 2, (min_lon + max_lon) / 2))
+
+    # Corners in ring order: (min, min), (max, min), (max, max), (min, max)
+    xs = np.stack([min_lon, max_lon, max_lon, min_lon], axis=1)
+    ys = np.stack([min_lat, min_lat, max_lat, max_lat], axis=1)
+
+    areas = np.empty(len(min_lon), dtype=np.float64)
+    for code in np.unique(epsg):
+        idx = epsg == code
+        px, py = get_transformer(WGS84, f"EPSG:{code}").transform(xs[idx], ys[idx])
+        px, py = np.asarray(px), np.asarray(py)
+        # Shoelace formula over the projected corner ring
+        areas[idx] = 0.5 * np.abs(
+            np.sum(px * np.roll(py, -1, axis=1) - np.roll(px, -1, axis=1) * py, axis=1)
+        )
+    return areas / 1e6
@@ -0,0 +1,345 @@
+"""Upload ingestion: multipart bodies streamed straight to disk, validation,
+COG conversion with overviews, and the scene store that makes uploads
+available to analyses."""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import uuid
+
+import aiofiles
+import numpy as np
+import rasterio
+from rasterio.shutil import copy as rio_copy
+from rasterio.warp import transform_bounds
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart < 0.0.13 only ships the ``multipart`` package name
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from compositing import Scene
+
+logger = logging.getLogger(__name__)
+
+# Form fields are small metadata values; anything larger is not a valid request
+MAX_FORM_FIELD_BYTES = 64 * 1024
+MAX_FORM_FIELDS = 16
+
+# Reflectance = DN * scale + offset, by dtype, when the raster does not declare its own
+# (8-bit imagery spans 0-255; 16-bit follows the Sentinel-2/Landsat L2 x10000 convention)
+DEFAULT_REFLECTANCE_SCALES = {
+    "uint8": 1.0 / 255.0,
+    "uint16": 1.0 / 10000.0,
+    "int16": 1.0 / 10000.0
+}
+
+RASTER_EXTENSIONS = (".tif", ".tiff")
+VECTOR_EXTENSIONS = (".geojson", ".json")
+
+
+class UploadTooLarge(Exception):
+    """Raised while streaming when an upload passes the size limit"""
+
+
+class MultipartUpload:
+    """Incremental multipart/form-data parser for one file part plus form fields.
+
+    File bytes are handed out per received chunk instead of being spooled, and
+    the size limit is checked as they arrive. Malformed bodies raise ValueError.
+    """
+
+    def __init__(self, content_type: str, max_bytes: int):
+        media_type, options = parse_options_header(content_type)
+        if media_type != b"multipart/form-data" or not options.get(b"boundary"):
+            raise ValueError("Expected a multipart/form-data body")
+        self.max_bytes = max_bytes
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.size_bytes = 0
+        self._file_data: List[bytes] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self._in_file = False
+        self._parser = MultipartParser(options[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_value = bytearray()
+        self._in_file = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise ValueError("Multipart part without a name")
+        if b"filename" in options:
+            if self.filename is not None:
+                raise ValueError("Only one file may be uploaded per request")
+            self.filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+            # Known from the part headers: refuse before any of the file is received
+            if upload_kind(self.filename) is None:
+                raise ValueError("Upload a .tif/.tiff raster or .geojson/.json boundary")
+            self._in_file = True
+        else:
+            if len(self.fields) >= MAX_FORM_FIELDS:
+                raise ValueError("Too many form fields")
+            self._field_name = options[b"name"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size_bytes += end - start
+            if self.size_bytes > self.max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB")
+            # Copied: the parser reuses the buffer it was given
+            self._file_data.append(bytes(data[start:end]))
+        else:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FORM_FIELD_BYTES:
+                raise ValueError(f"Form field {self._field_name} is too large")
+
+    def _on_part_end(self):
+        if self._field_name is not None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8")
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Parse one received chunk, returning the file bytes it contained"""
+        self._parser.write(chunk)
+        data, self._file_data = self._file_data, []
+        return data
+
+    def finish(self):
+        self._parser.finalize()
+        if self.filename is None:
+            raise ValueError("No file part in the upload")
+
+
+async def stream_multipart_upload(request, path: str, max_bytes: int) -> MultipartUpload:
+    """Parse the request body as it arrives, writing the file part to ``path``.
+
+    Reads ``request.stream()`` rather than an UploadFile, which Starlette only
+    hands over after spooling the whole body; an oversized upload is aborted
+    as soon as it passes ``max_bytes``.
+    """
+    # Reject early when the client announces a body that cannot fit
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + MAX_FORM_FIELDS * MAX_FORM_FIELD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+
+    upload = MultipartUpload(request.headers.get("content-type", ""), max_bytes)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            async for chunk in request.stream():
+                for data in upload.feed(chunk):
+                    await out.write(data)
+        upload.finish()
+    except BaseException:
+        # Never leave a partial file behind for the scene store to pick up
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return upload
+
+
+def upload_kind(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith(RASTER_EXTENSIONS):
+        return "raster"
+    if name.endswith(VECTOR_EXTENSIONS):
+        return "vector"
+    return None
+
+
+def reflectance_scaling(src) -> Tuple[float, float]:
+    """(scale, offset) turning the raster's values into 0-1 reflectance"""
+    scales, offsets = set(src.scales), set(src.offsets)
+    if len(scales) == 1 and len(offsets) == 1 and (scales, offsets) != ({1.0}, {0.0}):
+        # Declared in the file's metadata (e.g. by the processor that wrote it)
+        return float(scales.pop()), float(offsets.pop())
+    if np.issubdtype(np.dtype(src.dtypes[0]), np.floating):
+        return 1.0, 0.0
+    if src.dtypes[0] not in DEFAULT_REFLECTANCE_SCALES:
+        raise ValueError(f"No reflectance scale for {src.dtypes[0]} rasters; pass reflectance_scale")
+    return DEFAULT_REFLECTANCE_SCALES[src.dtypes[0]], 0.0
+
+
+def process_raster_upload(path: str, cog_path: str, scale: Optional[float] = None,
+                          offset: Optional[float] = None) -> Dict[str, Any]:
+    """Validate a GeoTIFF and rewrite it as a Cloud Optimized GeoTIFF with overviews"""
+    with rasterio.open(path) as src:
+        if src.crs is None:
+            raise ValueError("Raster has no CRS")
+        if src.transform.is_identity:
+            raise ValueError("Raster has no georeferencing transform")
+        bounds = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        if scale is None:
+            scale, default_offset = reflectance_scaling(src)
+            offset = default_offset if offset is None else offset
+        info = {
+            "width": src.width,
+            "height": src.height,
+            "band_count": src.count,
+            "dtype": src.dtypes[0],
+            "crs": src.crs.to_string(),
+            "resolution": list(src.res),
+            "bounds": list(bounds),
+            "reflectance_scale": scale,
+            "reflectance_offset": offset or 0.0
+        }
+
+    os.makedirs(os.path.dirname(cog_path) or ".", exist_ok=True)
+    # The COG driver tiles the data and builds the overview pyramid in one pass
+    rio_copy(path, cog_path, driver="COG", COMPRESS="DEFLATE", OVERVIEWS="AUTO", BLOCKSIZE=512)
+    with rasterio.open(cog_path) as cog:
+        info["overview_levels"] = cog.overviews(1)
+    return info
+
+
+def process_vector_upload(path: str) -> Dict[str, Any]:
+    """Validate a GeoJSON boundary file feature by feature"""
+    import fiona
+    from shapely.geometry import shape
+
+    geometry_types = set()
+    feature_count = 0
+    with fiona.open(path) as src:
+        for feature in src:
+            geometry = shape(feature["geometry"])
+            if not geometry.is_valid:
+                raise ValueError(f"Invalid geometry in feature {feature_count}")
+            geometry_types.add(geometry.geom_type)
+            feature_count += 1
+        if feature_count == 0:
+            raise ValueError("GeoJSON has no features")
+        crs = src.crs.to_string() if src.crs else "EPSG:4326"
+        bounds = src.bounds
+        if crs != "EPSG:4326":
+            bounds = transform_bounds(crs, "EPSG:4326", *bounds)
+    return {
+        "feature_count": feature_count,
+        "geometry_types": sorted(geometry_types),
+        "crs": crs,
+        "bounds": list(bounds)
+    }
+
+
+def load_vector_area(path: str) -> Dict[str, Any]:
+    """Dissolve an uploaded boundary file into one GeoJSON geometry"""
+    import fiona
+    from shapely.geometry import mapping, shape
+    from shapely.ops import unary_union
+
+    with fiona.open(path) as src:
+        return mapping(unary_union([shape(feature["geometry"]) for feature in src]))
+
+
+class SceneStore:
+    """Registry of uploaded rasters and boundaries, persisted as a JSON index.
+
+    Celery workers and tile pool processes hold their own instance, so the
+    index is reloaded whenever the file on disk changes (uploads are registered
+    by the API process).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._loaded_stamp: Optional[Tuple[int, int]] = None
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Reload the index if another process rewrote it; call with the lock held"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._loaded_stamp:
+            return
+        with open(self.index_path) as f:
+            self._records = json.load(f)
+        self._loaded_stamp = stamp
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._records, f)
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._loaded_stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def register(self, upload_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._refresh()
+            self._records[upload_id] = {**record, "upload_id": upload_id, "registered_at": datetime.now().isoformat()}
+            self._save()
+
+    def update(self, upload_id: str, fields: Dict[str, Any]):
+        with self._lock:
+            self._refresh()
+            self._records.setdefault(upload_id, {"upload_id": upload_id}).update(fields)
+            self._save()
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            record = self._records.get(upload_id)
+            return dict(record) if record is not None else None
+
+    def find_scenes(self, satellite_source: str, bands: List[str], bbox: Dict[str, Any],
+                    start_date: str, end_date: str) -> List[Scene]:
+        """Ready rasters for this source/band set that overlap the bbox and date range"""
+        with self._lock:
+            self._refresh()
+            records = list(self._records.values())
+        scenes = []
+        for record in records:
+            if record.get("kind") != "raster" or record.get("status") != "ready":
+                continue
+            if record.get("satellite_source") != satellite_source or record.get("bands") != list(bands):
+                continue
+            if not start_date <= record.get("acquisition_date", "") <= end_date:
+                continue
+            min_lon, min_lat, max_lon, max_lat = record["bounds"]
+            if (min_lon > bbox["max_lon"] or max_lon < bbox["min_lon"]
+                    or min_lat > bbox["max_lat"] or max_lat < bbox["min_lat"]):
+                continue
+            scenes.append(Scene(
+                scene_id=record["upload_id"],
+                acquisition_date=record["acquisition_date"],
+                cloud_cover=record.get("cloud_cover", 0.0),
+                bands=list(bands),
+                path=record["cog_path"],
+                scale=record.get("reflectance_scale", 1.0),
+                offset=record.get("reflectance_offset", 0.0)
+            ))
+        return scenes
@@ -1,11 +1,13 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import asyncio
 import json
 import os
+import socket
+import uuid
 from datetime import datetime, timedelta
 import logging
 
@@ -35,6 +37,28 @@ import os
 import tempfile
 import logging
 
+# Service modules
+from compositing import (
+    Scene, build_composite, build_composite_grid, build_incremental_max_ndvi, list_scenes, select_scenes
+)
+from geometry import create_bounding_box, create_bounding_boxes
+from ingest import (
+    SceneStore, UploadTooLarge, load_vector_area, process_raster_upload, process_vector_upload,
+    stream_multipart_upload, upload_kind
+)
+from partials import PartialAggregateCache, aggregate_scenes
+from planning import PeakRSSSampler, max_polygonize_pixels, plan_chunks
+from profiling import PROFILE_ARTIFACTS, load_profile_summary, profile_coroutine, run_blocking
+from retention import artifact_path, remove_expired_artifacts, slugify
+from scheduler import AnalysisScheduler, JobCancelled, JobTooLarge, SchedulerSaturated, PRIORITY_LANES
+from singleflight import SingleFlightRegistry
+from store import create_analysis_store
+from tiling import (
+    aggregate_tile_results, area_geometry, build_tile_grid, count_grid_cells, get_tile_workers, run_tiles,
+    stitch_mosaic, tile_processing_bbox
+)
+from vectorize import VECTOR_CLASSES, VECTOR_ZOOMS, classify_composite, iter_features, nearest_zoom, polygonize
+
 # Initialize Earth Engine (for Google Earth Engine data)
 try:
     ee.Initialize()
@@ -94,6 +118,25 @@ class AnalysisRequest(BaseModel):
     end_date: str
     analysis_type: str  # 'land_cover', 'change_detection', 'vegetation', 'water'
     satellite_source: str = 'sentinel-2'  # 'sentinel-2', 'landsat-8', 'sentinel-1'
+    priority: str = 'standard'  # 'alert', 'standard', 'exploration'
+    cloud_cover: float = 0.1  # maximum scene cloud cover used in the composite
+    composite_method: str = 'median'  # 'median', 'max_ndvi'
+    debug_profile: bool = False  # capture cProfile/tracemalloc artifacts for this run
+
+class GridAnalysisRequest(BaseModel):
+    region_name: str = 'Kenya'
+    area: Optional[Dict[str, Any]] = None  # GeoJSON geometry (e.g. a county); None = all of Kenya
+    area_upload_id: Optional[str] = None  # uploaded GeoJSON boundary to use as the area
+    tile_size_deg: float = 0.5
+    halo_km: float = 1.0
+    resolution_m: float = 250.0
+    start_date: str
+    end_date: str
+    analysis_type: str
+    satellite_source: str = 'sentinel-2'
+    cloud_cover: float = 0.1
+    composite_method: str = 'median'
+    priority: str = 'standard'
 
 class SatelliteDataRequest(BaseModel):
     region_name: str
@@ -112,8 +155,179 @@ class AIAnalysisResult(BaseModel):
     metadata: Dict[str, Any]
     created_at: str
 
+# Working directory for composites and other analysis artifacts
+GEOAI_DATA_DIR = os.getenv("GEOAI_DATA_DIR", "data")
+
+# Memory one analysis may use for raster blocks; sets the composite chunk size
+GEOAI_JOB_MEMORY_BUDGET_MB = float(os.getenv("GEOAI_JOB_MEMORY_BUDGET_MB", "512"))
+
+# Artifacts (composites, vectors, partials, ...) untouched for this long are deleted; 0 keeps them
+GEOAI_ARTIFACT_TTL_HOURS = float(os.getenv("GEOAI_ARTIFACT_TTL_HOURS", "168"))
+
+# Per-scene partial aggregates shared by rolling-window re-analyses
+partial_cache = PartialAggregateCache(os.path.join(GEOAI_DATA_DIR, "partials"))
+
+# Polygons smaller than this are dropped from vector outputs
+GEOAI_MIN_POLYGON_AREA_M2 = float(os.getenv("GEOAI_MIN_POLYGON_AREA_M2", "5000"))
+
+# Uploaded rasters and boundaries, available to later analyses
+scene_store = SceneStore(os.path.join(GEOAI_DATA_DIR, "uploads"))
+GEOAI_MAX_UPLOAD_MB = int(os.getenv("GEOAI_MAX_UPLOAD_MB", "2048"))
+
+# Execution mode: 'local' runs analyses in this process, 'celery' hands them to workers
+ANALYSIS_EXECUTION_MODE = os.getenv("GEOAI_EXECUTION_MODE", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Analysis state; shared through Redis when workers run in other processes.
+# Records expire after the TTL; the in-memory store also caps how many it keeps.
+analysis_store = create_analysis_store(
+    ANALYSIS_EXECUTION_MODE, REDIS_URL,
+    max_records=int(os.getenv("GEOAI_STORE_MAX_RECORDS", "1000")),
+    ttl_seconds=int(os.getenv("GEOAI_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+)
+
+# Single-flight registry: canonical request key -> analysis_id of the running job
+single_flight = SingleFlightRegistry()
+
+def canonical_request_key(request: AnalysisRequest) -> str:
+    """Build a stable key so identical analysis requests map to one computation"""
+    # Priority only affects scheduling, not the computed result
+    params = request.model_dump(exclude={"priority"})
+    params["region_name"] = params["region_name"].strip().lower()
+    params["analysis_type"] = params["analysis_type"].strip().lower()
+    params["satellite_source"] = params["satellite_source"].strip().lower()
+    # ~0.1 m precision, so clients serialising coordinates differently still match
+    params["latitude"] = round(params["latitude"], 6)
+    params["longitude"] = round(params["longitude"], 6)
+    params["radius_km"] = round(params["radius_km"], 3)
+    return json.dumps(params, sort_keys=True)
+
+# Bounded job scheduler; per-type limits keep heavy analyses from taking every slot
+ANALYSIS_TYPE_CONCURRENCY = {
+    # Each grid analysis already fans out across every core
+    "grid": 1,
+    "change_detection": 2,
+    "land_cover_classification": 2,
+    "urban_expansion": 2,
+    "ingest": 2
+}
+
+analysis_scheduler = AnalysisScheduler(
+    max_concurrent=int(os.getenv("GEOAI_MAX_CONCURRENT_ANALYSES", "4")),
+    max_queued=int(os.getenv("GEOAI_MAX_QUEUED_ANALYSES", "100")),
+    memory_budget_mb=float(os.getenv("GEOAI_MEMORY_BUDGET_MB", "2048")),
+    type_limits=ANALYSIS_TYPE_CONCURRENCY
+)
+
+def estimate_analysis_memory_mb(request: AnalysisRequest) -> float:
+    """Planned peak memory of the analysis once chunked to the per-job budget"""
+    source = MOCK_SATELLITE_DATA.get(request.satellite_source, {})
+    bbox = create_bounding_box(request.latitude, request.longitude, request.radius_km)
+    grid = build_composite_grid(bbox, source.get("resolution", 10))
+    # Catalogue scenes under the cloud limit; the median reducer depends on how many there are
+    scenes, _ = select_scenes(
+        list_scenes(bbox, request.start_date, request.end_date, request.satellite_source, source.get("bands", [])),
+        request.cloud_cover
+    )
+    # Only vector outputs read the composite; other analyses just stream scene statistics
+    method = request.composite_method if request.analysis_type in VECTOR_CLASSES else "statistics"
+    plan = plan_chunks(
+        grid.width, grid.height, len(source.get("bands", [])) or 1,
+        method=method, budget_mb=GEOAI_JOB_MEMORY_BUDGET_MB,
+        scene_count=len(scenes)
+    )
+    return plan.planned_peak_mb
+
+# Upper bound on grid cells a grid analysis may cover (checked before the grid is built)
+GEOAI_MAX_GRID_TILES = int(os.getenv("GEOAI_MAX_GRID_TILES", "2000"))
+
+def plan_grid_parallelism(request: GridAnalysisRequest, tiles) -> Dict[str, float]:
+    """Per-tile planned peak and how many tiles may run at once inside the memory budget"""
+    source = MOCK_SATELLITE_DATA.get(request.satellite_source, {})
+    bands = source.get("bands", [])
+    # Tiles nearest the equator are the widest in metres
+    tile = min(tiles, key=lambda t: abs(t.min_lat + t.max_lat))
+    bbox = tile_processing_bbox(tile)
+    grid = build_composite_grid(bbox, request.resolution_m)
+    scenes, _ = select_scenes(
+        list_scenes(bbox, request.start_date, request.end_date, request.satellite_source, bands),
+        request.cloud_cover
+    )
+    plan = plan_chunks(
+        grid.width, grid.height, len(bands) or 1,
+        method=request.composite_method, budget_mb=GEOAI_JOB_MEMORY_BUDGET_MB,
+        scene_count=len(scenes)
+    )
+    fitting = int(analysis_scheduler.memory_budget_mb // max(plan.planned_peak_mb, 1.0))
+    parallel = max(1, min(get_tile_workers(), len(tiles), fitting))
+    return {"tile_peak_mb": plan.planned_peak_mb, "parallel": parallel,
+            "memory_mb": parallel * plan.planned_peak_mb}
+
+# Retry-After hint when the worker queue is full (roughly one analysis' runtime)
+GEOAI_WORKER_RETRY_AFTER_SECONDS = int(os.getenv("GEOAI_WORKER_RETRY_AFTER_SECONDS", "60"))
+
+def enqueue_worker_analysis(analysis_id: str, request: AnalysisRequest):
+    """Hand an analysis to the Celery workers (distributed execution mode).
+
+    Admission mirrors the local scheduler: JobTooLarge when the analysis needs
+    more than a worker's memory budget, SchedulerSaturated when the broker
+    already holds GEOAI_MAX_QUEUED_ANALYSES waiting analyses.
+    """
+    from worker import queued_analysis_count, run_analysis_task
+    
+    memory_mb = estimate_analysis_memory_mb(request)
+    if memory_mb > analysis_scheduler.memory_budget_mb:
+        raise JobTooLarge(
+            f"Job needs ~{memory_mb:.0f} MB, above the {analysis_scheduler.memory_budget_mb:.0f} MB budget"
+        )
+    if queued_analysis_count() >= analysis_scheduler.max_queued:
+        raise SchedulerSaturated("Worker queue is full", retry_after=GEOAI_WORKER_RETRY_AFTER_SECONDS)
+    
+    # Redis transport treats 0 as the highest priority; spread lanes across 0-9
+    run_analysis_task.apply_async(
+        args=[analysis_id, request.model_dump()],
+        task_id=analysis_id,
+        priority=PRIORITY_LANES.get(request.priority, PRIORITY_LANES["standard"]) * 3
+    )
+
+async def cancel_worker_analysis(analysis_id: str) -> Optional[str]:
+    """Revoke a queued worker analysis; running ones poll the store and stop"""
+    record = await analysis_store.aget(analysis_id)
+    if record is None or record.get("status") != "processing":
+        return None
+    from worker import celery_app
+    
+    await run_blocking(celery_app.control.revoke, analysis_id)
+    return "running" if "worker" in record else "queued"
+
+async def run_profiled_analysis(analysis_id: str, request: AnalysisRequest, job=None):
+    """Run an analysis under cProfile/tracemalloc and keep the artifacts"""
+    profile_dir = artifact_path(GEOAI_DATA_DIR, "profiles", analysis_id)
+    try:
+        await profile_coroutine(lambda: run_ai_analysis(analysis_id, request, job), profile_dir)
+    finally:
+        # Failed and cancelled runs keep their profile too
+        summary = await run_blocking(load_profile_summary, profile_dir)
+        if summary is not None:
+            summary["url"] = f"/analysis/{analysis_id}/profile"
+            await analysis_store.aupdate(analysis_id, {"profile": summary})
+            logger.info(
+                f"Profiled analysis {analysis_id}: {summary['wall_seconds']}s, "
+                f"peak {summary['traced_peak_mb']} MB traced"
+            )
+
+async def run_single_flight_analysis(request_key: str, analysis_id: str, request: AnalysisRequest, job=None):
+    """Run an analysis and release its single-flight slot when it finishes"""
+    try:
+        if request.debug_profile:
+            await run_profiled_analysis(analysis_id, request, job)
+        else:
+            await run_ai_analysis(analysis_id, request, job)
+    finally:
+        single_flight.release(request_key, analysis_id)
+
 # Background task for long-running analyses
-async def run_ai_analysis(analysis_id: str, request: AnalysisRequest):
+async def run_ai_analysis(analysis_id: str, request: AnalysisRequest, job=None):
     """Background task for running AI analysis"""
     try:
         logger.info(f"Starting AI analysis {analysis_id} for {request.region_name}")
@@ -125,42 +339,69 @@ async def run_ai_analysis(analysis_id: str, request: AnalysisRequest):
             start_date=request.start_date,
             end_date=request.end_date,
             satellite_source=request.satellite_source,
-            radius_km=request.radius_km
+            radius_km=request.radius_km,
+            cloud_cover=request.cloud_cover
+        )
+        
+        # Cloud-free temporal composite over the date range, only when vector outputs read it
+        satellite_data["composite"] = None
+        if request.analysis_type in VECTOR_CLASSES:
+            satellite_data["composite"] = await create_temporal_composite(
+                analysis_id, satellite_data, request.composite_method,
+                cancel_check=job.check_cancelled if job is not None else None
+            )
+        
+        # Index statistics merged from cached per-scene partials; only new scenes are reduced
+        satellite_data["temporal_statistics"] = await create_temporal_statistics(
+            analysis_id, satellite_data, request.analysis_type,
+            cancel_check=job.check_cancelled if job is not None else None
         )
         
         # Run AI analysis based on type
-        if request.analysis_type == 'land_cover_classification':
-            results = await run_land_cover_analysis(satellite_data, request)
-        elif request.analysis_type == 'change_detection':
-            results = await run_change_detection_analysis(satellite_data, request)
-        elif request.analysis_type == 'vegetation_health':
-            results = await run_vegetation_analysis(satellite_data, request)
-        elif request.analysis_type == 'water_body_detection':
-            results = await run_water_analysis(satellite_data, request)
-        elif request.analysis_type == 'drought_monitoring':
-            results = await run_drought_monitoring_analysis(satellite_data, request)
-        elif request.analysis_type == 'soil_moisture':
-            results = await run_soil_moisture_analysis(satellite_data, request)
-        elif request.analysis_type == 'urban_expansion':
-            results = await run_urban_expansion_analysis(satellite_data, request)
-        else:
+        analyzer = ANALYZERS.get(request.analysis_type)
+        if analyzer is None:
             raise ValueError(f"Unknown analysis type: {request.analysis_type}")
+        results = await analyzer(satellite_data, request)
+        if satellite_data["temporal_statistics"] is not None:
+            results["temporal_statistics"] = satellite_data["temporal_statistics"]
+        
+        # Polygonized class outputs for land cover, water and change results
+        vectors = await create_vector_outputs(
+            analysis_id, satellite_data, request.analysis_type,
+            cancel_check=job.check_cancelled if job is not None else None
+        )
+        if vectors is not None:
+            results["vectors"] = vectors
         
         # Save results to database
         await save_analysis_results(analysis_id, request, results)
         
         logger.info(f"Completed AI analysis {analysis_id}")
         
+    except JobCancelled:
+        logger.info(f"AI analysis {analysis_id} cancelled")
+        raise
     except Exception as e:
         logger.error(f"Error in AI analysis {analysis_id}: {e}")
         await save_analysis_error(analysis_id, str(e))
+        # Re-raise so the scheduler (or Celery) records the job as failed
+        raise
 
 async def download_satellite_data(latitude: float, longitude: float, start_date: str, 
-                                end_date: str, satellite_source: str, radius_km: float):
+                                end_date: str, satellite_source: str, radius_km: float,
+                                cloud_cover: float = 0.1, bbox: Optional[Dict[str, Any]] = None):
     """Download satellite data for the specified region and time period"""
     try:
-        # Create a bounding box around the point
-        bbox = create_bounding_box(latitude, longitude, radius_km)
+        # Create a bounding box around the point unless the caller supplies one (grid tiles)
+        if bbox is None:
+            bbox = create_bounding_box(latitude, longitude, radius_km)
+        bands = MOCK_SATELLITE_DATA.get(satellite_source, {}).get("bands", [])
+        
+        # Every acquisition in the date range, minus scenes above the cloud cover limit
+        scenes = list_scenes(bbox, start_date, end_date, satellite_source, bands)
+        scenes += scene_store.find_scenes(satellite_source, bands, bbox, start_date, end_date)
+        scenes.sort(key=lambda scene: scene.acquisition_date)
+        used_scenes, skipped_scenes = select_scenes(scenes, cloud_cover)
         
         # For now, return mock data with realistic structure
         # In production, this would query Sentinel Hub, Earth Engine, or other APIs
@@ -172,27 +413,122 @@ async def download_satellite_data(latitude: float, longitude: float, start_date:
             "end_date": end_date,
             "bbox": bbox,
             "data_available": True,
-            "bands": MOCK_SATELLITE_DATA.get(satellite_source, {}).get("bands", []),
+            "bands": bands,
             "resolution": MOCK_SATELLITE_DATA.get(satellite_source, {}).get("resolution", 10),
-            "cloud_cover": np.random.uniform(0.1, 0.3),
-            "acquisition_date": start_date
+            "cloud_cover": float(np.mean([scene.cloud_cover for scene in used_scenes])) if used_scenes else None,
+            "max_cloud_cover": cloud_cover,
+            "acquisition_date": used_scenes[-1].acquisition_date if used_scenes else start_date,
+            "acquisition_dates": [scene.acquisition_date for scene in used_scenes],
+            "scenes": [scene.__dict__ for scene in used_scenes],
+            "scenes_skipped": len(skipped_scenes)
         }
     except Exception as e:
         logger.error(f"Error downloading satellite data: {e}")
         raise
 
-def create_bounding_box(lat: float, lon: float, radius_km: float):
-    """Create a bounding box around a point"""
-    # Approximate conversion: 1 degree ≈ 111 km
-    lat_delta = radius_km / 111.0
-    lon_delta = radius_km / (111.0 * np.cos(np.radians(lat)))
+async def create_temporal_composite(analysis_id: str, satellite_data: Dict, method: str,
+                                    cancel_check=None):
+    """Stream the selected scenes into a cloud-masked composite GeoTIFF"""
+    if not satellite_data.get("bands") or not satellite_data.get("scenes"):
+        logger.info(f"No optical scenes to composite for analysis {analysis_id}")
+        return None
     
-    return {
-        "min_lat": lat - lat_delta,
-        "max_lat": lat + lat_delta,
-        "min_lon": lon - lon_delta,
-        "max_lon": lon + lon_delta
+    scenes = [Scene(**scene) for scene in satellite_data["scenes"]]
+    grid = build_composite_grid(satellite_data["bbox"], satellite_data["resolution"])
+    output_path = artifact_path(GEOAI_DATA_DIR, "composites", analysis_id, ".tif")
+    
+    # Size blocks so the working set stays inside the per-job memory budget
+    plan = plan_chunks(
+        grid.width, grid.height, len(satellite_data["bands"]),
+        method=method, budget_mb=GEOAI_JOB_MEMORY_BUDGET_MB, scene_count=len(scenes)
+    )
+    if not plan.within_budget:
+        logger.warning(
+            f"Analysis {analysis_id}: smallest block needs {plan.planned_peak_mb} MB, "
+            f"over the {plan.budget_mb} MB budget"
+        )
+    
+    # Block reads and reductions are CPU/IO bound; keep them off the event loop.
+    # Resident memory is sampled while the composite builds to check the plan.
+    with PeakRSSSampler() as sampler:
+        if method == "max_ndvi":
+            # Merged from cached per-period composites; only periods with new scenes are read
+            composite = await run_blocking(
+                build_incremental_max_ndvi, scenes, grid, satellite_data["bands"], output_path,
+                partial_cache.directory,
+                satellite_source=satellite_data["satellite_source"],
+                block_size=plan.block_size,
+                cancel_check=cancel_check
+            )
+        else:
+            composite = await run_blocking(
+                build_composite, scenes, grid, satellite_data["bands"], output_path,
+                method=method,
+                satellite_source=satellite_data["satellite_source"],
+                block_size=plan.block_size,
+                cancel_check=cancel_check
+            )
+    composite["scene_count"] = len(scenes)
+    composite["memory"] = {
+        "plan": plan.to_dict(),
+        "planned_peak_mb": plan.planned_peak_mb,
+        # Process-wide RSS growth: includes other jobs running in this process at the time
+        "measured_rss_growth_mb": sampler.peak_growth_mb
     }
+    logger.info(
+        f"Built {method} composite from {len(scenes)} scenes ({composite['scenes_read']} read) "
+        f"for analysis {analysis_id} (block {plan.block_size}px, planned {plan.planned_peak_mb} MB, "
+        f"measured RSS growth {sampler.peak_growth_mb} MB)"
+    )
+    return composite
+
+async def create_temporal_statistics(analysis_id: str, satellite_data: Dict, analysis_type: str,
+                                     cancel_check=None, extent=None, clip=None):
+    """Merge per-scene index aggregates for the analysis window"""
+    if not satellite_data.get("bands") or not satellite_data.get("scenes"):
+        return None
+    
+    scenes = [Scene(**scene) for scene in satellite_data["scenes"]]
+    grid = build_composite_grid(satellite_data["bbox"], satellite_data["resolution"])
+    # Planned separately from the composite, which may not be built at all
+    plan = plan_chunks(
+        grid.width, grid.height, len(satellite_data["bands"]),
+        method="statistics", budget_mb=GEOAI_JOB_MEMORY_BUDGET_MB
+    )
+    statistics = await run_blocking(
+        aggregate_scenes, scenes, grid, analysis_type, satellite_data["satellite_source"],
+        partial_cache, plan.block_size, cancel_check, extent, clip
+    )
+    if statistics is not None:
+        logger.info(
+            f"Analysis {analysis_id}: {statistics['index']} statistics from "
+            f"{statistics['scenes_reused']} cached and {statistics['scenes_computed']} new scenes"
+        )
+    return statistics
+
+async def create_vector_outputs(analysis_id: str, satellite_data: Dict, analysis_type: str,
+                                cancel_check=None):
+    """Classify the composite and polygonize it into per-zoom vector files"""
+    composite = satellite_data.get("composite")
+    if analysis_type not in VECTOR_CLASSES or composite is None:
+        return None
+    
+    grid = build_composite_grid(satellite_data["bbox"], satellite_data["resolution"])
+    class_path = artifact_path(GEOAI_DATA_DIR, "classes", analysis_id, ".tif")
+    await run_blocking(
+        classify_composite, analysis_type, satellite_data, grid, class_path,
+        composite["block_size"], cancel_check
+    )
+    # Polygonizing holds the whole class raster; larger rasters are coarsened to fit the budget
+    vectors = await run_blocking(
+        polygonize, class_path, VECTOR_CLASSES[analysis_type],
+        artifact_path(GEOAI_DATA_DIR, "vectors", analysis_id), GEOAI_MIN_POLYGON_AREA_M2,
+        max_pixels=max_polygonize_pixels(GEOAI_JOB_MEMORY_BUDGET_MB)
+    )
+    vectors["url"] = f"/analysis/{analysis_id}/vectors"
+    # Recorded so the API can tell a missing output from one left on a worker's local disk
+    vectors["host"] = socket.gethostname()
+    return vectors
 
 async def run_land_cover_analysis(satellite_data: Dict, request: AnalysisRequest):
     """Run land cover classification analysis"""
@@ -565,16 +901,125 @@ async def run_urban_expansion_analysis(satellite_data: Dict, request: AnalysisRe
         logger.error(f"Error in urban expansion analysis: {e}")
         raise
 
-async def save_analysis_results(analysis_id: str, request: AnalysisRequest, results: Dict):
+# Registered analyzers by analysis type
+ANALYZERS = {
+    'land_cover_classification': run_land_cover_analysis,
+    'change_detection': run_change_detection_analysis,
+    'vegetation_health': run_vegetation_analysis,
+    'water_body_detection': run_water_analysis,
+    'drought_monitoring': run_drought_monitoring_analysis,
+    'soil_moisture': run_soil_moisture_analysis,
+    'urban_expansion': run_urban_expansion_analysis
+}
+
+async def run_grid_analysis(analysis_id: str, request: GridAnalysisRequest, tiles, max_parallel: int, job=None):
+    """Background task for tiled grid analyses over large areas"""
+    try:
+        logger.info(
+            f"Starting grid analysis {analysis_id}: {len(tiles)} tiles of {request.tile_size_deg} deg, "
+            f"{max_parallel} at a time"
+        )
+        tile_outputs = await run_tiles(
+            analysis_id, tiles, request.model_dump(),
+            cancel_check=job.check_cancelled if job is not None else None,
+            max_parallel=max_parallel
+        )
+        
+        # Stitch tile cores into one lon/lat mosaic at roughly the requested resolution
+        mosaic = await run_blocking(
+            stitch_mosaic, tile_outputs,
+            artifact_path(GEOAI_DATA_DIR, "mosaics", analysis_id, ".tif"),
+            request.resolution_m / 111320.0
+        )
+        results = {
+            "aggregate": aggregate_tile_results(tile_outputs),
+            "mosaic": mosaic,
+            "tile_count": len(tile_outputs),
+            "total_area_km2": sum(output["tile"]["weight_km2"] for output in tile_outputs),
+            "tiles": [
+                {"tile_id": output["tile"]["tile_id"], "weight_km2": output["tile"]["weight_km2"],
+                 "results": output["results"]}
+                for output in tile_outputs
+            ],
+            "processing_date": datetime.now().isoformat()
+        }
+        await save_analysis_results(analysis_id, request, results)
+        logger.info(f"Completed grid analysis {analysis_id}")
+        
+    except JobCancelled:
+        logger.info(f"Grid analysis {analysis_id} cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Error in grid analysis {analysis_id}: {e}")
+        await save_analysis_error(analysis_id, str(e))
+        raise
+
+async def process_upload(upload_id: str, job=None):
+    """Validate an upload and convert rasters to COG with overviews"""
+    record = scene_store.get(upload_id)
+    try:
+        scene_store.update(upload_id, {"status": "processing"})
+        if record["kind"] == "raster":
+            cog_path = os.path.join(GEOAI_DATA_DIR, "uploads", "cog", f"{upload_id}.tif")
+            info = await run_blocking(
+                process_raster_upload, record["raw_path"], cog_path,
+                record.get("reflectance_scale"), record.get("reflectance_offset")
+            )
+            if record.get("bands") and len(record["bands"]) != info["band_count"]:
+                raise ValueError(f"{len(record['bands'])} band names given for {info['band_count']} bands")
+            info["cog_path"] = cog_path
+        else:
+            info = await run_blocking(process_vector_upload, record["raw_path"])
+        
+        scene_store.update(upload_id, {**info, "status": "ready", "processed_at": datetime.now().isoformat()})
+        logger.info(f"Upload {upload_id} ingested")
+    except Exception as e:
+        logger.error(f"Error ingesting upload {upload_id}: {e}")
+        scene_store.update(upload_id, {"status": "failed", "error": str(e)})
+        raise
+
+async def save_analysis_results(analysis_id: str, request: BaseModel, results: Dict):
     """Save analysis results to database"""
     # This would connect to your PostgreSQL database
-    # For now, we'll just log the results
+    # For now, we keep results in memory and log them
     logger.info(f"Saving results for analysis {analysis_id}")
     logger.info(f"Results: {json.dumps(results, indent=2)}")
+    if ((await analysis_store.aget(analysis_id)) or {}).get("status") == "cancelled":
+        logger.info(f"Discarding results for cancelled analysis {analysis_id}")
+        return
+    await analysis_store.aupdate(analysis_id, {
+        "status": "completed",
+        "results": results,
+        "completed_at": datetime.now().isoformat()
+    })
 
 async def save_analysis_error(analysis_id: str, error_message: str):
     """Save analysis error to database"""
     logger.error(f"Analysis {analysis_id} failed: {error_message}")
+    if ((await analysis_store.aget(analysis_id)) or {}).get("status") == "cancelled":
+        return
+    await analysis_store.aupdate(analysis_id, {
+        "status": "failed",
+        "error": error_message,
+        "completed_at": datetime.now().isoformat()
+    })
+
+_retention_task: Optional[asyncio.Task] = None
+
+async def run_artifact_retention():
+    """Hourly sweep of expired analysis artifacts on the data volume"""
+    while True:
+        try:
+            await run_blocking(remove_expired_artifacts, GEOAI_DATA_DIR, GEOAI_ARTIFACT_TTL_HOURS * 3600)
+        except Exception as e:
+            logger.error(f"Error removing expired artifacts: {e}")
+        await asyncio.sleep(3600)
+
+@app.on_event("startup")
+async def start_artifact_retention():
+    global _retention_task
+    if GEOAI_ARTIFACT_TTL_HOURS > 0:
+        _retention_task = asyncio.create_task(run_artifact_retention())
 
 # API Endpoints
 @app.get("/")
@@ -590,14 +1035,182 @@ async def health_check():
     }
 
 @app.post("/analyze", response_model=AIAnalysisResult)
-async def start_analysis(request: AnalysisRequest, background_tasks: BackgroundTasks):
+async def start_analysis(request: AnalysisRequest):
     """Start an AI-powered geospatial analysis"""
     try:
+        single_flight.stats["submitted"] += 1
+        request_key = canonical_request_key(request)
+        metadata = {
+            "satellite_source": request.satellite_source,
+            "radius_km": request.radius_km,
+            "start_date": request.start_date,
+            "end_date": request.end_date
+        }
+        
+        if request.priority not in PRIORITY_LANES:
+            raise HTTPException(status_code=400, detail=f"Unknown priority: {request.priority}")
+        if request.composite_method not in ("median", "max_ndvi"):
+            raise HTTPException(status_code=400, detail=f"Unknown composite method: {request.composite_method}")
+        try:
+            datetime.strptime(request.start_date, "%Y-%m-%d")
+            datetime.strptime(request.end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+        
+        # Attach to an identical analysis that is already queued or running
+        running = await single_flight.find_running(request_key, analysis_store.aget)
+        if running is not None:
+            running_id, running = running
+            logger.info(f"Coalesced analysis request for {request.region_name} into {running_id}")
+            # An alert attaching to a queued exploration job must not wait in the exploration lane
+            if ANALYSIS_EXECUTION_MODE != "celery" and analysis_scheduler.promote(running_id, request.priority):
+                logger.info(f"Promoted analysis {running_id} to {request.priority} priority")
+            return AIAnalysisResult(
+                analysis_id=running_id,
+                region_name=request.region_name,
+                analysis_type=request.analysis_type,
+                results=running.get("results", {"status": running.get("status", "processing")}),
+                metadata={**metadata, "coalesced": True},
+                created_at=running.get("created_at", datetime.now().isoformat())
+            )
+        
         # Generate unique analysis ID
-        analysis_id = f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{request.region_name}"
+        analysis_id = (
+            f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{slugify(request.region_name)}_{uuid.uuid4().hex[:8]}"
+        )
+        created_at = datetime.now().isoformat()
+        record = {
+            "status": "processing",
+            "region_name": request.region_name,
+            "analysis_type": request.analysis_type,
+            "created_at": created_at
+        }
+        # Reserved before the first await so identical concurrent requests coalesce into this job
+        single_flight.reserve(request_key, analysis_id, record)
+        
+        # Queue the analysis (locally or on the workers); 429 when the queue is full,
+        # 422 when the analysis cannot fit the memory budget
+        try:
+            await analysis_store.aupdate(analysis_id, record)
+            if ANALYSIS_EXECUTION_MODE == "celery":
+                await run_blocking(enqueue_worker_analysis, analysis_id, request)
+            else:
+                analysis_scheduler.submit(
+                    analysis_id,
+                    request.analysis_type,
+                    lambda job: run_single_flight_analysis(request_key, analysis_id, request, job),
+                    priority=request.priority,
+                    memory_mb=estimate_analysis_memory_mb(request)
+                )
+        except JobTooLarge as e:
+            single_flight.release(request_key, analysis_id)
+            await analysis_store.aupdate(analysis_id, {"status": "rejected"})
+            raise HTTPException(status_code=422, detail=f"{e}; reduce radius_km")
+        except SchedulerSaturated as e:
+            single_flight.release(request_key, analysis_id)
+            await analysis_store.aupdate(analysis_id, {"status": "rejected"})
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except BaseException:
+            single_flight.release(request_key, analysis_id)
+            raise
+        
+        single_flight.confirm(analysis_id)
+        
+        return AIAnalysisResult(
+            analysis_id=analysis_id,
+            region_name=request.region_name,
+            analysis_type=request.analysis_type,
+            results={"status": "processing"},
+            metadata={**metadata, "priority": request.priority},
+            created_at=created_at
+        )
         
-        # Add analysis to background tasks
-        background_tasks.add_task(run_ai_analysis, analysis_id, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/grid", response_model=AIAnalysisResult)
+async def start_grid_analysis(request: GridAnalysisRequest):
+    """Start a tiled analysis over a large area (all of Kenya or a county polygon)"""
+    try:
+        if request.analysis_type not in ANALYZERS:
+            raise HTTPException(status_code=400, detail=f"Unknown analysis type: {request.analysis_type}")
+        if request.priority not in PRIORITY_LANES:
+            raise HTTPException(status_code=400, detail=f"Unknown priority: {request.priority}")
+        if request.tile_size_deg <= 0 or request.resolution_m <= 0 or request.halo_km < 0:
+            raise HTTPException(status_code=400, detail="tile_size_deg and resolution_m must be positive, halo_km non-negative")
+        if request.composite_method not in ("median", "max_ndvi"):
+            raise HTTPException(status_code=400, detail=f"Unknown composite method: {request.composite_method}")
+        try:
+            datetime.strptime(request.start_date, "%Y-%m-%d")
+            datetime.strptime(request.end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+        if request.area is not None:
+            try:
+                area_shape = area_geometry(request.area)
+            except Exception:
+                raise HTTPException(status_code=400, detail="area must be a GeoJSON Polygon or MultiPolygon geometry")
+            if area_shape.geom_type not in ("Polygon", "MultiPolygon") or area_shape.is_empty or not area_shape.is_valid:
+                raise HTTPException(status_code=400, detail="area must be a valid, non-empty GeoJSON Polygon or MultiPolygon")
+        
+        area = request.area
+        if request.area_upload_id is not None:
+            upload = scene_store.get(request.area_upload_id)
+            if upload is None or upload.get("kind") != "vector" or upload.get("status") != "ready":
+                raise HTTPException(status_code=400, detail=f"No ready boundary upload {request.area_upload_id}")
+            area = await run_blocking(load_vector_area, upload["raw_path"])
+        
+        # Reject oversized grids up front; building one is proportional to its cell count
+        cell_count = count_grid_cells(area, request.tile_size_deg)
+        if cell_count > GEOAI_MAX_GRID_TILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"tile_size_deg {request.tile_size_deg} gives {cell_count} grid cells, "
+                       f"above the {GEOAI_MAX_GRID_TILES} limit; use larger tiles"
+            )
+        tiles = await run_blocking(build_tile_grid, area, request.tile_size_deg, request.halo_km)
+        if not tiles:
+            raise HTTPException(status_code=400, detail="Area does not intersect any tile")
+        parallelism = plan_grid_parallelism(request, tiles)
+        
+        analysis_id = (
+            f"grid_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{slugify(request.region_name)}_{uuid.uuid4().hex[:8]}"
+        )
+        created_at = datetime.now().isoformat()
+        await analysis_store.aupdate(analysis_id, {
+            "status": "processing",
+            "region_name": request.region_name,
+            "analysis_type": request.analysis_type,
+            "created_at": created_at
+        })
+        
+        # Tiles run on the local process pool (also in celery mode); the reservation covers
+        # every tile that may run at once
+        try:
+            analysis_scheduler.submit(
+                analysis_id,
+                "grid",
+                lambda job: run_grid_analysis(analysis_id, request, tiles, int(parallelism["parallel"]), job),
+                priority=request.priority,
+                memory_mb=parallelism["memory_mb"]
+            )
+        except JobTooLarge as e:
+            await analysis_store.aupdate(analysis_id, {"status": "rejected"})
+            raise HTTPException(status_code=422, detail=f"{e}; use smaller tiles or a coarser resolution_m")
+        except SchedulerSaturated as e:
+            await analysis_store.aupdate(analysis_id, {"status": "rejected"})
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
         
         return AIAnalysisResult(
             analysis_id=analysis_id,
@@ -605,22 +1218,35 @@ async def start_analysis(request: AnalysisRequest, background_tasks: BackgroundT
             analysis_type=request.analysis_type,
             results={"status": "processing"},
             metadata={
+                "mode": "grid",
+                "tile_count": len(tiles),
+                "parallel_tiles": int(parallelism["parallel"]),
+                "tile_peak_mb": parallelism["tile_peak_mb"],
+                "tile_size_deg": request.tile_size_deg,
+                "halo_km": request.halo_km,
+                "resolution_m": request.resolution_m,
                 "satellite_source": request.satellite_source,
-                "radius_km": request.radius_km,
                 "start_date": request.start_date,
-                "end_date": request.end_date
+                "end_date": request.end_date,
+                "priority": request.priority
             },
-            created_at=datetime.now().isoformat()
+            created_at=created_at
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error starting analysis: {e}")
+        logger.error(f"Error starting grid analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/analysis/{analysis_id}")
 async def get_analysis_results(analysis_id: str):
     """Get analysis results by ID"""
     try:
+        stored = await analysis_store.aget(analysis_id)
+        if stored is not None:
+            return {"analysis_id": analysis_id, **stored}
+        
         # This would query your database
         # For now, return mock data
         return {
@@ -636,6 +1262,100 @@ async def get_analysis_results(analysis_id: str):
         logger.error(f"Error getting analysis results: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analysis/{analysis_id}/vectors")
+async def get_analysis_vectors(analysis_id: str, zoom: Optional[int] = None, bbox: Optional[str] = None,
+                               format: str = "ndjson"):
+    """Stream vector results as NDJSON (optionally a bbox subset) or download FlatGeobuf"""
+    try:
+        vector_dir = artifact_path(GEOAI_DATA_DIR, "vectors", analysis_id)
+    except ValueError:
+        vector_dir = None
+    if vector_dir is None:
+        raise HTTPException(status_code=404, detail=f"No vector output for analysis {analysis_id}")
+    if not os.path.isdir(vector_dir):
+        record = await analysis_store.aget(analysis_id)
+        vectors = ((record or {}).get("results") or {}).get("vectors")
+        if vectors is not None:
+            # Written by a Celery worker whose GEOAI_DATA_DIR is not shared with this API
+            raise HTTPException(
+                status_code=503,
+                detail=f"Vector output for analysis {analysis_id} was written on host {vectors.get('host')} "
+                       f"and is not visible here; GEOAI_DATA_DIR must be shared storage across workers"
+            )
+        raise HTTPException(status_code=404, detail=f"No vector output for analysis {analysis_id}")
+    selected_zoom = nearest_zoom(list(VECTOR_ZOOMS), zoom)
+    
+    if format == "fgb":
+        # FlatGeobuf carries its own spatial index; clients range-request bbox subsets
+        return FileResponse(
+            os.path.join(vector_dir, f"z{selected_zoom}.fgb"),
+            media_type="application/flatgeobuf",
+            filename=f"{analysis_id}_z{selected_zoom}.fgb"
+        )
+    if format != "ndjson":
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'fgb'")
+    
+    bounds = None
+    if bbox is not None:
+        try:
+            bounds = tuple(float(value) for value in bbox.split(","))
+        except ValueError:
+            bounds = ()
+        if len(bounds) != 4:
+            raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    
+    return StreamingResponse(
+        iter_features(vector_dir, selected_zoom, bounds),
+        media_type="application/x-ndjson",
+        headers={"X-Vector-Zoom": str(selected_zoom)}
+    )
+
+@app.get("/analysis/{analysis_id}/profile")
+async def get_analysis_profile(analysis_id: str):
+    """Get the profiling summary of an analysis started with debug_profile"""
+    try:
+        summary = load_profile_summary(artifact_path(GEOAI_DATA_DIR, "profiles", analysis_id))
+    except ValueError:
+        summary = None
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile for analysis {analysis_id}")
+    summary["downloads"] = {
+        name: f"/analysis/{analysis_id}/profile/{name}" for name in summary["artifacts"]
+    }
+    return summary
+
+@app.get("/analysis/{analysis_id}/profile/{artifact}")
+async def download_analysis_profile(analysis_id: str, artifact: str):
+    """Download a profiling artifact (pstats, text report or tracemalloc diff)"""
+    if artifact not in PROFILE_ARTIFACTS:
+        raise HTTPException(status_code=404, detail=f"Unknown profile artifact {artifact}")
+    try:
+        path = os.path.join(artifact_path(GEOAI_DATA_DIR, "profiles", analysis_id), artifact)
+    except ValueError:
+        path = None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No {artifact} for analysis {analysis_id}")
+    return FileResponse(path, filename=f"{analysis_id}_{artifact}")
+
+@app.delete("/analysis/{analysis_id}")
+async def cancel_analysis(analysis_id: str):
+    """Cancel a queued or running analysis"""
+    if ANALYSIS_EXECUTION_MODE == "celery":
+        previous_status = await cancel_worker_analysis(analysis_id)
+    else:
+        previous_status = analysis_scheduler.cancel(analysis_id)
+    if previous_status is None:
+        raise HTTPException(status_code=404, detail=f"No queued or running analysis {analysis_id}")
+    
+    # Free the single-flight slot so a resubmission starts a fresh job
+    single_flight.release_analysis(analysis_id)
+    await analysis_store.aupdate(analysis_id, {
+        "status": "cancelled",
+        "completed_at": datetime.now().isoformat()
+    })
+    logger.info(f"Cancelled analysis {analysis_id} (was {previous_status})")
+    return {"analysis_id": analysis_id, "status": "cancelled", "previous_status": previous_status}
+
 @app.post("/satellite-data")
 async def download_satellite_data_endpoint(request: SatelliteDataRequest):
     """Download satellite data for a region"""
@@ -646,7 +1366,8 @@ async def download_satellite_data_endpoint(request: SatelliteDataRequest):
             start_date=request.start_date,
             end_date=request.end_date,
             satellite_source=request.satellite_source,
-            radius_km=10.0
+            radius_km=10.0,
+            cloud_cover=request.cloud_cover
         )
         
         return {
@@ -659,9 +1380,126 @@ async def download_satellite_data_endpoint(request: SatelliteDataRequest):
         logger.error(f"Error downloading satellite data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/upload")
+async def upload_data(request: Request):
+    """Upload a GeoTIFF (e.g. drone imagery resampled to a source's bands) or GeoJSON boundary.
+
+    multipart/form-data fields: file, region_name, and optionally acquisition_date,
+    satellite_source, bands, reflectance_scale and reflectance_offset.
+    """
+    upload_id = f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    part_path = os.path.join(GEOAI_DATA_DIR, "uploads", "raw", f"{upload_id}.part")
+    try:
+        # The body is parsed as it arrives and the file written straight to disk;
+        # an oversized upload is aborted mid-stream instead of after spooling
+        try:
+            upload = await stream_multipart_upload(request, part_path, GEOAI_MAX_UPLOAD_MB * 1024 * 1024)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        fields = upload.fields
+        # The parser already rejected unsupported file types before receiving their data
+        kind = upload_kind(upload.filename)
+        try:
+            if not fields.get("region_name"):
+                raise HTTPException(status_code=400, detail="region_name is required")
+            # Scene lookups compare dates as strings and composites parse them, so keep them canonical
+            acquisition_date = fields.get("acquisition_date") or datetime.now().strftime("%Y-%m-%d")
+            try:
+                acquisition_date = datetime.strptime(acquisition_date, "%Y-%m-%d").strftime("%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="acquisition_date must be YYYY-MM-DD")
+            
+            # Rasters feed composites, so they must use a catalogue source's band set
+            satellite_source = fields.get("satellite_source", "sentinel-2")
+            source_bands = MOCK_SATELLITE_DATA.get(satellite_source, {}).get("bands")
+            bands = [band.strip() for band in fields["bands"].split(",")] if fields.get("bands") else source_bands
+            if kind == "raster" and (source_bands is None or bands != source_bands):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Raster uploads must declare a satellite_source of {sorted(MOCK_SATELLITE_DATA)} "
+                           f"and that source's bands in order"
+                )
+            try:
+                scale = float(fields["reflectance_scale"]) if fields.get("reflectance_scale") else None
+                offset = float(fields["reflectance_offset"]) if fields.get("reflectance_offset") else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail="reflectance_scale and reflectance_offset must be numbers")
+        except HTTPException:
+            os.remove(part_path)
+            raise
+        
+        extension = os.path.splitext(upload.filename)[1].lower()
+        raw_path = os.path.join(GEOAI_DATA_DIR, "uploads", "raw", f"{upload_id}{extension}")
+        os.replace(part_path, raw_path)
+        
+        scene_store.register(upload_id, {
+            "kind": kind,
+            "status": "uploaded",
+            "filename": upload.filename,
+            "region_name": fields["region_name"],
+            "acquisition_date": acquisition_date,
+            "satellite_source": satellite_source,
+            "bands": bands,
+            "reflectance_scale": scale,
+            "reflectance_offset": offset,
+            "raw_path": raw_path,
+            "size_bytes": upload.size_bytes
+        })
+        
+        # Validation and COG/overview building run after the response is sent
+        try:
+            analysis_scheduler.submit(upload_id, "ingest", lambda job: process_upload(upload_id, job))
+        except SchedulerSaturated as e:
+            scene_store.update(upload_id, {"status": "failed", "error": str(e)})
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        
+        return {
+            "success": True,
+            "upload_id": upload_id,
+            "kind": kind,
+            "status": "processing",
+            "size_bytes": upload.size_bytes,
+            "message": f"{kind.capitalize()} upload received for {fields['region_name']}"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading data: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Get upload ingestion status and metadata"""
+    record = scene_store.get(upload_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return record
+
+@app.get("/stats")
+async def get_stats():
+    """Get request coalescing, scheduler and partial-aggregate cache counters"""
+    return {
+        "single_flight": {
+            **single_flight.stats,
+            "in_flight": len(single_flight)
+        },
+        "scheduler": analysis_scheduler.snapshot(),
+        "partial_aggregate_cache": partial_cache.stats
+    }
+
 @app.get("/regions/kenya")
-async def get_kenya_regions():
-    """Get list of Kenya regions for analysis"""
+async def get_kenya_regions(radius_km: float = 10.0):
+    """Get list of Kenya regions for analysis, each with its analysis bounding box"""
+    if not 0 < radius_km <= 500:
+        raise HTTPException(status_code=400, detail="radius_km must be in (0, 500]")
     kenya_regions = [
         {
             "name": "Nairobi",
@@ -694,8 +1532,20 @@ async def get_kenya_regions():
             "county_code": "027"
         }
     ]
-    
-    return {"regions": kenya_regions}
+
+    # One vectorised call for every site instead of a transformer setup per region
+    bboxes = create_bounding_boxes(
+        [region["latitude"] for region in kenya_regions],
+        [region["longitude"] for region in kenya_regions],
+        radius_km
+    )
+    for i, region in enumerate(kenya_regions):
+        region["bbox"] = {
+            key: int(values[i]) if key == "utm_epsg" else round(float(values[i]), 6)
+            for key, values in bboxes.items()
+        }
+
+    return {"regions": kenya_regions, "radius_km": radius_km}
 
 @app.get("/analysis-types")
 async def get_analysis_types():
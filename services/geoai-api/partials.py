@@ -0,0 +1,279 @@
+"""Mergeable per-scene partial aggregates for incremental re-analysis.
+
+Each scene's spectral index is reduced once to counts, sums, sums of squares,
+a histogram and class counts. A rolling date window then only reduces the
+scenes it has not seen before and merges them with the cached partials.
+"""
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+import numpy as np
+import shapely
+
+from compositing import CompositeGrid, Scene, SceneReader
+from geometry import WGS84, get_transformer
+
+logger = logging.getLogger(__name__)
+
+# Bump when the reduction changes so stale cached partials are not reused
+PARTIALS_VERSION = 2
+
+HISTOGRAM_BINS = 40
+HISTOGRAM_RANGE = (-1.0, 1.0)
+
+# Normalised-difference index each analyzer aggregates
+ANALYSIS_INDICES = {
+    "land_cover_classification": "NDVI",
+    "change_detection": "NDVI",
+    "vegetation_health": "NDVI",
+    "drought_monitoring": "NDVI",
+    "water_body_detection": "NDWI",
+    "soil_moisture": "NDMI",
+    "urban_expansion": "NDBI"
+}
+
+# (positive band, negative band) per index and source
+INDEX_BANDS = {
+    "sentinel-2": {"NDVI": ("B8", "B4"), "NDWI": ("B3", "B8"), "NDMI": ("B8", "B11"), "NDBI": ("B11", "B8")},
+    "landsat-8": {"NDVI": ("B5", "B4"), "NDWI": ("B3", "B5"), "NDMI": ("B5", "B6"), "NDBI": ("B6", "B5")}
+}
+
+# Lower class edges per index; class i covers [edges[i], edges[i + 1])
+INDEX_CLASSES = {
+    "NDVI": {"poor": -1.0, "moderate": 0.2, "healthy": 0.5},
+    "NDWI": {"dry": -1.0, "water": 0.0},
+    "NDMI": {"dry": -1.0, "moist": 0.2},
+    "NDBI": {"non_built": -1.0, "built_up": 0.0}
+}
+
+
+@dataclass
+class PartialAggregate:
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    minimum: float = float("inf")
+    maximum: float = float("-inf")
+    histogram: List[int] = field(default_factory=lambda: [0] * HISTOGRAM_BINS)
+    class_counts: Dict[str, int] = field(default_factory=dict)
+
+    def add_values(self, values: np.ndarray, classes: Dict[str, float]):
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.total += float(values.sum(dtype=np.float64))
+        self.total_sq += float(np.square(values, dtype=np.float64).sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        hist, _ = np.histogram(values, bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE)
+        self.histogram = [a + int(b) for a, b in zip(self.histogram, hist)]
+        names = list(classes)
+        edges = np.array([classes[name] for name in names])
+        class_index = np.searchsorted(edges, values, side="right") - 1
+        for index, n in zip(*np.unique(np.clip(class_index, 0, len(names) - 1), return_counts=True)):
+            self.class_counts[names[index]] = self.class_counts.get(names[index], 0) + int(n)
+
+    def merge(self, other: "PartialAggregate") -> "PartialAggregate":
+        merged = PartialAggregate(
+            count=self.count + other.count,
+            total=self.total + other.total,
+            total_sq=self.total_sq + other.total_sq,
+            minimum=min(self.minimum, other.minimum),
+            maximum=max(self.maximum, other.maximum),
+            histogram=[a + b for a, b in zip(self.histogram, other.histogram)],
+            class_counts=dict(self.class_counts)
+        )
+        for name, n in other.class_counts.items():
+            merged.class_counts[name] = merged.class_counts.get(name, 0) + n
+        return merged
+
+    def summary(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"count": 0}
+        mean = self.total / self.count
+        variance = max(0.0, self.total_sq / self.count - mean ** 2)
+        return {
+            "count": self.count,
+            "mean": mean,
+            "std": variance ** 0.5,
+            "min": self.minimum,
+            "max": self.maximum,
+            "histogram": {"bins": HISTOGRAM_BINS, "range": list(HISTOGRAM_RANGE), "counts": self.histogram},
+            "class_percentages": {name: 100.0 * n / self.count for name, n in self.class_counts.items()}
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_summary(cls, summary: Dict[str, Any]) -> "PartialAggregate":
+        """Rebuild the sums behind a summary so summaries can be merged exactly"""
+        count = summary.get("count", 0)
+        if count == 0:
+            return cls()
+        return cls(
+            count=count,
+            total=summary["mean"] * count,
+            total_sq=(summary["std"] ** 2 + summary["mean"] ** 2) * count,
+            minimum=summary["min"],
+            maximum=summary["max"],
+            histogram=list(summary["histogram"]["counts"]),
+            class_counts={
+                name: int(round(percentage * count / 100.0))
+                for name, percentage in summary["class_percentages"].items()
+            }
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PartialAggregate":
+        return cls(**data)
+
+
+class PartialAggregateCache:
+    """Per-scene partials on disk, keyed by scene, grid and index"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+    def get(self, key: str) -> Optional[PartialAggregate]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                partial = PartialAggregate.from_dict(json.load(f))
+            # Refresh the mtime so artifact retention keeps partials that rolling windows still use
+            os.utime(path)
+        except (FileNotFoundError, ValueError, TypeError):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return partial
+
+    def put(self, key: str, partial: PartialAggregate):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write-then-rename so concurrent readers never see a half-written file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(partial.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+def merge_statistics(statistics: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Merge aggregate_scenes outputs, e.g. from the tiles of a grid analysis"""
+    statistics = [item for item in statistics if item]
+    if not statistics:
+        return None
+    total = PartialAggregate()
+    for item in statistics:
+        total = total.merge(PartialAggregate.from_summary(item))
+    return {
+        "index": statistics[0]["index"],
+        "scenes_reused": sum(item["scenes_reused"] for item in statistics),
+        "scenes_computed": sum(item["scenes_computed"] for item in statistics),
+        **total.summary()
+    }
+
+
+def partial_cache_key(scene: Scene, grid: CompositeGrid, index: str,
+                      extent: Optional[Tuple[float, float, float, float]] = None, clip=None) -> str:
+    extent_signature = "full" if extent is None else ",".join(f"{value:.8f}" for value in extent)
+    if clip is not None:
+        extent_signature += f"|{hashlib.sha1(shapely.to_wkb(clip)).hexdigest()}"
+    return f"v{PARTIALS_VERSION}|{scene.scene_id}|{grid.signature()}|{extent_signature}|{index}"
+
+
+def extent_masks(grid: CompositeGrid, extent: Tuple[float, float, float, float],
+                 block_size: int, clip=None) -> List[np.ndarray]:
+    """Per-window masks of pixels whose centres fall in the half-open lon/lat extent.
+
+    Grid tiles are read with a halo; counting only pixels centred in the tile's
+    core means each pixel is counted by exactly one tile when tiles are merged.
+    ``clip`` (a lon/lat shapely geometry) further restricts them to the
+    requested area.
+    """
+    min_lon, min_lat, max_lon, max_lat = extent
+    transformer = get_transformer(grid.crs, WGS84)
+    masks = []
+    for window in grid.windows(block_size):
+        rows, cols = np.mgrid[window.row_off:window.row_off + window.height,
+                              window.col_off:window.col_off + window.width]
+        xs = grid.transform.c + (cols + 0.5) * grid.transform.a + (rows + 0.5) * grid.transform.b
+        ys = grid.transform.f + (cols + 0.5) * grid.transform.d + (rows + 0.5) * grid.transform.e
+        lons, lats = transformer.transform(xs, ys)
+        mask = (lons >= min_lon) & (lons < max_lon) & (lats >= min_lat) & (lats < max_lat)
+        if clip is not None:
+            mask &= shapely.intersects_xy(clip, lons, lats)
+        masks.append(mask)
+    return masks
+
+
+def reduce_scene(scene: Scene, grid: CompositeGrid, index: str, band_pair: Tuple[str, str],
+                 block_size: int, cancel_check: Optional[Callable[[], None]] = None,
+                 masks: Optional[List[np.ndarray]] = None) -> PartialAggregate:
+    """Stream one scene block by block into its partial aggregate"""
+    positive_index = scene.bands.index(band_pair[0])
+    negative_index = scene.bands.index(band_pair[1])
+    partial = PartialAggregate()
+    with SceneReader(grid) as reader:
+        for i, window in enumerate(grid.windows(block_size)):
+            if cancel_check is not None:
+                cancel_check()
+            block = reader.read(scene, window)
+            positive, negative = block[positive_index], block[negative_index]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = (positive - negative) / (positive + negative)
+            if masks is not None:
+                values = values[masks[i]]
+            partial.add_values(values, INDEX_CLASSES[index])
+    return partial
+
+
+def aggregate_scenes(scenes: List[Scene], grid: CompositeGrid, analysis_type: str, satellite_source: str,
+                     cache: PartialAggregateCache, block_size: int,
+                     cancel_check: Optional[Callable[[], None]] = None,
+                     extent: Optional[Tuple[float, float, float, float]] = None,
+                     clip=None) -> Optional[Dict[str, Any]]:
+    """Merge per-scene partials for the window, reducing only uncached scenes.
+
+    ``extent`` (min_lon, min_lat, max_lon, max_lat) restricts the statistics to
+    pixels centred inside it, e.g. a grid tile's core without its halo, and
+    ``clip`` to pixels centred in that lon/lat geometry.
+    """
+    index = ANALYSIS_INDICES.get(analysis_type)
+    band_pair = INDEX_BANDS.get(satellite_source, {}).get(index)
+    if index is None or band_pair is None:
+        return None
+
+    total = PartialAggregate()
+    reused = computed = 0
+    masks = None
+    for scene in scenes:
+        key = partial_cache_key(scene, grid, index, extent, clip)
+        partial = cache.get(key)
+        if partial is None:
+            if extent is not None and masks is None:
+                masks = extent_masks(grid, extent, block_size, clip)
+            partial = reduce_scene(scene, grid, index, band_pair, block_size, cancel_check, masks)
+            cache.put(key, partial)
+            computed += 1
+        else:
+            reused += 1
+        total = total.merge(partial)
+
+    return {
+        "index": index,
+        "scenes_reused": reused,
+        "scenes_computed": computed,
+        "acquisition_dates": [scene.acquisition_date for scene in scenes],
+        **total.summary()
+    }
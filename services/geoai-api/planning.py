@@ -0,0 +1,162 @@
+"""Memory-budget-aware chunk planning for raster analyses.
+
+Estimates a job's working set from its grid size, band count and dtype, then
+picks the largest block size whose per-block working set fits the per-worker
+memory budget.
+"""
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+import math
+import os
+import threading
+
+import numpy as np
+
+from compositing import MEDIAN_BINS, MEDIAN_RESULT_CHUNK, MEDIAN_STACK_MAX_SCENES
+
+# Block edges are kept to multiples of the GeoTIFF tile alignment
+BLOCK_ALIGNMENT = 16
+MIN_BLOCK_SIZE = 16
+MAX_BLOCK_SIZE = 1024
+
+
+@dataclass
+class ChunkPlan:
+    width: int
+    height: int
+    band_count: int
+    dtype: str
+    method: str
+    block_size: int
+    bytes_per_pixel: float
+    budget_mb: float
+    planned_peak_mb: float
+    # What the same job would need if it held the whole grid at once
+    unchunked_mb: float
+    within_budget: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def working_set_bytes_per_pixel(band_count: int, dtype: str, method: str,
+                                scene_count: Optional[int] = None) -> float:
+    """Peak bytes held per block pixel by the composite reducers (or the statistics pass).
+
+    Calibrated against tracemalloc peaks of ``build_composite``, with some
+    headroom for allocator overhead.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    # Scene block as read, its masked copy and NaN-filled float32 form, plus the composite written out
+    io_bytes = band_count * (3 * itemsize + 8)
+    if method == "median" and scene_count is not None and scene_count <= MEDIAN_STACK_MAX_SCENES:
+        # float32 scene stack, sorted in place, plus int64 valid counts/indices and the two picks
+        return io_bytes + band_count * (scene_count * 4 + 48)
+    if method == "median":
+        # uint16 histogram plus the clip/scale/bin-index temporaries of one add()
+        return io_bytes + band_count * (MEDIAN_BINS * 2 + 64)
+    if method == "statistics":
+        # One scene block plus its index values, float64 squares, class indices and masks
+        return io_bytes + 48
+    # max_ndvi: kept band values, NDVI of best and current scene, boolean masks
+    return io_bytes + band_count * 4 + 16
+
+
+def fixed_working_set_bytes(band_count: int, method: str, scene_count: Optional[int] = None) -> float:
+    """Peak bytes a block needs regardless of its size"""
+    if method == "median" and (scene_count is None or scene_count > MEDIAN_STACK_MAX_SCENES):
+        # One result() slice: int32 cumulative histogram, comparison mask and float64 interpolation
+        return band_count * MEDIAN_RESULT_CHUNK * (MEDIAN_BINS * 8 + 64)
+    return 0.0
+
+
+def plan_chunks(width: int, height: int, band_count: int, dtype: str = "float32",
+                method: str = "median", budget_mb: float = 512.0,
+                scene_count: Optional[int] = None) -> ChunkPlan:
+    """Choose the largest aligned block size that fits ``budget_mb``"""
+    per_pixel = working_set_bytes_per_pixel(band_count, dtype, method, scene_count)
+    fixed = fixed_working_set_bytes(band_count, method, scene_count)
+    budget_bytes = budget_mb * 1024 ** 2
+
+    block = int(math.sqrt(max(budget_bytes - fixed, 0) / per_pixel)) // BLOCK_ALIGNMENT * BLOCK_ALIGNMENT
+    # No point in blocks larger than the grid itself
+    grid_edge = math.ceil(max(width, height) / BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+    block = max(MIN_BLOCK_SIZE, min(block, MAX_BLOCK_SIZE, grid_edge))
+
+    block_pixels = min(block, width) * min(block, height)
+    planned_peak = (block_pixels * per_pixel + fixed) / 1024 ** 2
+    return ChunkPlan(
+        width=width,
+        height=height,
+        band_count=band_count,
+        dtype=str(np.dtype(dtype)),
+        method=method,
+        block_size=block,
+        bytes_per_pixel=per_pixel,
+        budget_mb=budget_mb,
+        planned_peak_mb=round(planned_peak, 2),
+        unchunked_mb=round((width * height * per_pixel + fixed) / 1024 ** 2, 2),
+        within_budget=planned_peak <= budget_mb
+    )
+
+
+# Polygonizing holds the whole class raster: uint8 classes, sieved copy and mask,
+# plus GDAL's polygon label buffers (measured 6-12 bytes/pixel as RSS growth)
+POLYGONIZE_BYTES_PER_PIXEL = 16
+
+
+def max_polygonize_pixels(budget_mb: float) -> int:
+    """Largest class raster (in pixels) that can be sieved and polygonized within ``budget_mb``"""
+    return max(1, int(budget_mb * 1024 ** 2 // POLYGONIZE_BYTES_PER_PIXEL))
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRSSSampler:
+    """Measure how far resident memory grows while a block of work runs.
+
+    A background thread samples RSS every ``interval`` seconds; the result is
+    the peak above the RSS at entry. RSS is process wide, so jobs running
+    concurrently in the same process add to the figure.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.baseline: Optional[int] = None
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_bytes()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self.baseline = self.peak = current_rss_bytes()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            rss = current_rss_bytes()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+
+    @property
+    def peak_growth_mb(self) -> Optional[float]:
+        if self.baseline is None:
+            return None
+        return round((self.peak - self.baseline) / 1024 ** 2, 2)
@@ -0,0 +1,207 @@
+"""Opt-in per-analysis profiling with cProfile and tracemalloc.
+
+A profiled analysis runs on its own event loop in a dedicated thread so its
+cProfile data is not mixed with other jobs on the API loop. Blocking stages go
+through ``run_blocking``, which also profiles the worker thread when the
+calling analysis is being profiled.
+
+tracemalloc is process wide, so overlapping profiled analyses share one
+tracing session: the first starts it, the last stops it, and the peak is only
+reset when no other profiled analysis is running. Snapshots and reports are
+taken on the profiled analysis's own thread, never on the API event loop.
+
+From Python 3.12 cProfile is built on ``sys.monitoring`` and only one profiler
+may be active per process. A thread that cannot enable its profiler then runs
+unprofiled and is counted in the summary's ``unprofiled_threads``.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ARTIFACTS = ("profile.pstats", "profile.txt", "tracemalloc.txt", "summary.json")
+
+_active_session: ContextVar[Optional["ProfileSession"]] = ContextVar("geoai_profile_session", default=None)
+
+# Profiled analyses currently tracing, by session id -> whether another one overlapped it
+_tracing_lock = threading.Lock()
+_tracing_sessions: Dict[int, bool] = {}
+_started_tracing = False
+
+
+class ProfileSession:
+    """Collects the cProfile data of every thread one analysis runs on"""
+
+    def __init__(self):
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self.unprofiled_threads = 0
+
+    def add(self, profiler: cProfile.Profile):
+        with self._lock:
+            self._profiles.append(profiler)
+
+    def enable(self, profiler: cProfile.Profile) -> bool:
+        """Enable ``profiler`` unless another profiler already holds the process (Python 3.12+)"""
+        try:
+            profiler.enable()
+        except ValueError as e:
+            logger.warning(f"Running unprofiled: {e}")
+            with self._lock:
+                self.unprofiled_threads += 1
+            return False
+        return True
+
+    def call(self, func: Callable, *args, **kwargs):
+        profiler = cProfile.Profile()
+        if not self.enable(profiler):
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self.add(profiler)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """``asyncio.to_thread`` that joins the current analysis's profile, if any"""
+    session = _active_session.get()
+    if session is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.to_thread(session.call, func, *args, **kwargs)
+
+
+def _start_tracing(session: "ProfileSession") -> tracemalloc.Snapshot:
+    """Join the shared tracemalloc session and return the starting snapshot"""
+    global _started_tracing
+    with _tracing_lock:
+        if _tracing_sessions:
+            # Resetting the peak here would wipe the peak of the analyses already running
+            for key in _tracing_sessions:
+                _tracing_sessions[key] = True
+            _tracing_sessions[id(session)] = True
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                _started_tracing = True
+            tracemalloc.reset_peak()
+            _tracing_sessions[id(session)] = False
+        return tracemalloc.take_snapshot()
+
+
+def _stop_tracing(session: "ProfileSession"):
+    """Leave the shared session; returns (final snapshot, peak bytes, overlapped)"""
+    global _started_tracing
+    with _tracing_lock:
+        after = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        overlapped = _tracing_sessions.pop(id(session))
+        # Tracing started outside this module (e.g. PYTHONTRACEMALLOC) is left running
+        if not _tracing_sessions and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+    return after, peak_bytes, overlapped
+
+
+def load_profile_summary(output_dir: str) -> Optional[Dict[str, Any]]:
+    summary_path = os.path.join(output_dir, "summary.json")
+    if not os.path.exists(summary_path):
+        return None
+    with open(summary_path) as f:
+        return json.load(f)
+
+
+async def profile_coroutine(coro_factory: Callable[[], Awaitable[Any]], output_dir: str,
+                            top: int = 50) -> Dict[str, Any]:
+    """Run a coroutine under cProfile and tracemalloc, writing artifacts to ``output_dir``.
+
+    Artifacts are also written when the coroutine raises; the error is then
+    recorded in the summary and re-raised.
+    """
+    session = ProfileSession()
+
+    def run() -> Dict[str, Any]:
+        _active_session.set(session)
+        # tracemalloc is process wide: allocations of concurrent jobs show up too
+        before = _start_tracing(session)
+        started = time.perf_counter()
+        error = None
+        profiler = cProfile.Profile()
+        profiling = session.enable(profiler)
+        try:
+            asyncio.run(coro_factory())
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if profiling:
+                profiler.disable()
+                session.add(profiler)
+            wall_seconds = time.perf_counter() - started
+            after, peak_bytes, overlapped = _stop_tracing(session)
+            summary = _write_artifacts(session, before, after, output_dir, wall_seconds, peak_bytes,
+                                       overlapped, error, top)
+        return summary
+
+    # Snapshots, comparisons and reports can take seconds on a large heap: keep them off the loop
+    return await asyncio.to_thread(run)
+
+
+def _write_artifacts(session: ProfileSession, before, after, output_dir: str, wall_seconds: float,
+                     peak_bytes: int, overlapped: bool, error: Optional[str], top: int) -> Dict[str, Any]:
+    os.makedirs(output_dir, exist_ok=True)
+    stats = session.stats()
+    if stats is not None:
+        stats.dump_stats(os.path.join(output_dir, "profile.pstats"))
+        report = io.StringIO()
+        pstats.Stats(os.path.join(output_dir, "profile.pstats"), stream=report) \
+            .sort_stats("cumulative").print_stats(top)
+        with open(os.path.join(output_dir, "profile.txt"), "w") as f:
+            f.write(report.getvalue())
+
+    allocation_diff = after.compare_to(before, "lineno")
+    with open(os.path.join(output_dir, "tracemalloc.txt"), "w") as f:
+        f.write(f"Peak traced memory: {peak_bytes / 1024 ** 2:.1f} MB\n\n")
+        for entry in allocation_diff[:top]:
+            f.write(f"{entry}\n")
+
+    summary = {
+        "wall_seconds": round(wall_seconds, 3),
+        "profiled_threads": len(session._profiles),
+        "unprofiled_threads": session.unprofiled_threads,
+        "total_calls": stats.total_calls if stats is not None else 0,
+        "traced_peak_mb": round(peak_bytes / 1024 ** 2, 2),
+        # Another profiled analysis ran meanwhile, so the peak covers both
+        "traced_peak_shared": overlapped,
+        "error": error,
+        "top_allocations": [str(entry) for entry in allocation_diff[:10]],
+        "artifacts": [
+            name for name in PROFILE_ARTIFACTS
+            if name != "summary.json" and os.path.exists(os.path.join(output_dir, name))
+        ],
+        "created_at": datetime.now().isoformat()
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,71 @@
+"""Retention for analysis artifacts under ``GEOAI_DATA_DIR``.
+
+Composites, class rasters, vectors, mosaics, profiles and per-scene partials
+are removed once they have not been modified for the configured age. Uploads
+are user data registered in the scene store and are never removed here.
+"""
+from typing import Dict, Tuple
+import logging
+import os
+import re
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIRS = ("composites", "classes", "vectors", "mosaics", "profiles", "partials")
+
+# Artifact names are built from analysis IDs; anything else must never reach a path
+SAFE_ARTIFACT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+def slugify(value: str, max_length: int = 40) -> str:
+    """Lowercase ASCII slug for embedding user-supplied names in IDs and paths"""
+    slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+    return slug[:max_length].strip("-") or "region"
+
+
+def artifact_path(data_dir: str, kind: str, artifact_id: str, suffix: str = "") -> str:
+    """Path of one artifact; rejects IDs that could escape the artifact directory"""
+    if kind not in ARTIFACT_DIRS or not SAFE_ARTIFACT_ID.match(artifact_id) or ".." in artifact_id:
+        raise ValueError(f"Invalid artifact id: {artifact_id!r}")
+    return os.path.join(data_dir, kind, f"{artifact_id}{suffix}")
+
+
+def _newest_mtime(path: str) -> float:
+    if not os.path.isdir(path):
+        return os.path.getmtime(path)
+    newest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return newest
+
+
+def remove_expired_artifacts(data_dir: str, max_age_seconds: float,
+                             kinds: Tuple[str, ...] = ARTIFACT_DIRS) -> Dict[str, int]:
+    """Delete artifacts not modified within ``max_age_seconds``; returns counts per kind"""
+    cutoff = time.time() - max_age_seconds
+    removed = {}
+    for kind in kinds:
+        directory = os.path.join(data_dir, kind)
+        if not os.path.isdir(directory):
+            continue
+        count = 0
+        for entry in os.scandir(directory):
+            try:
+                if _newest_mtime(entry.path) >= cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                count += 1
+            except FileNotFoundError:
+                # Removed concurrently (e.g. another API replica on the shared volume)
+                continue
+        if count:
+            removed[kind] = count
+    if removed:
+        logger.info(f"Removed expired artifacts: {removed}")
+    return removed
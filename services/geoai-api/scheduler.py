@@ -0,0 +1,195 @@
+"""In-process analysis scheduler with priority lanes, per-type concurrency
+limits, memory-aware admission and cooperative cancellation."""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first
+PRIORITY_LANES = {
+    "alert": 0,
+    "standard": 1,
+    "exploration": 2
+}
+
+
+class SchedulerSaturated(Exception):
+    """Raised when a job cannot be admitted; carries a Retry-After hint"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobTooLarge(Exception):
+    """Raised when a job needs more memory than the whole budget; retrying cannot help"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that noticed its cancellation request"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    analysis_type: str
+    priority: int
+    memory_mb: float
+    run: Callable[["Job"], Awaitable[Any]]
+    sequence: int
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+    cancel_requested: bool = False
+
+    def check_cancelled(self):
+        """Cooperative cancellation point for long-running stages"""
+        if self.cancel_requested:
+            raise JobCancelled(self.job_id)
+
+
+class AnalysisScheduler:
+    """Bounded priority scheduler for analysis jobs running on the event loop"""
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 100,
+                 memory_budget_mb: float = 2048.0,
+                 type_limits: Optional[Dict[str, int]] = None,
+                 default_job_seconds: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.memory_budget_mb = memory_budget_mb
+        self.type_limits = type_limits or {}
+        self._queue: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._sequence = itertools.count()
+        self._avg_job_seconds = default_job_seconds
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    @property
+    def reserved_memory_mb(self) -> float:
+        return sum(job.memory_mb for job in self._running.values())
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a slot frees up for a newly rejected job"""
+        backlog = len(self._queue) + len(self._running)
+        return max(1, int(self._avg_job_seconds * backlog / max(1, self.max_concurrent)))
+
+    def submit(self, job_id: str, analysis_type: str, run: Callable[[Job], Awaitable[Any]],
+               priority: str = "standard", memory_mb: float = 0.0) -> Job:
+        """Queue a job, or raise JobTooLarge/SchedulerSaturated when it cannot be admitted"""
+        if memory_mb > self.memory_budget_mb:
+            self.stats["rejected"] += 1
+            raise JobTooLarge(
+                f"Job needs ~{memory_mb:.0f} MB, above the {self.memory_budget_mb:.0f} MB budget"
+            )
+        if len(self._queue) >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise SchedulerSaturated("Analysis queue is full", retry_after=self.retry_after())
+
+        job = Job(
+            job_id=job_id,
+            analysis_type=analysis_type,
+            priority=PRIORITY_LANES.get(priority, PRIORITY_LANES["standard"]),
+            memory_mb=memory_mb,
+            run=run,
+            sequence=next(self._sequence)
+        )
+        self._queue.append(job)
+        self._jobs[job_id] = job
+        self.stats["admitted"] += 1
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def promote(self, job_id: str, priority: str) -> bool:
+        """Move a queued job to a higher-priority lane, e.g. when an alert coalesces onto it"""
+        job = self._jobs.get(job_id)
+        lane = PRIORITY_LANES.get(priority, PRIORITY_LANES["standard"])
+        if job is None or job.status != "queued" or lane >= job.priority:
+            return False
+        job.priority = lane
+        self._dispatch()
+        return True
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued or running job, returning its previous status"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return None
+
+        previous = job.status
+        job.cancel_requested = True
+        if previous == "queued":
+            self._queue.remove(job)
+            self._finish(job, "cancelled")
+        elif job.task is not None:
+            # Interrupts the job at its next await; CPU stages poll check_cancelled()
+            job.task.cancel()
+        return previous
+
+    def _can_start(self, job: Job) -> bool:
+        limit = self.type_limits.get(job.analysis_type)
+        if limit is not None:
+            running_of_type = sum(1 for j in self._running.values() if j.analysis_type == job.analysis_type)
+            if running_of_type >= limit:
+                return False
+        # Always let a job run on an idle scheduler so large jobs cannot starve
+        return not self._running or self.reserved_memory_mb + job.memory_mb <= self.memory_budget_mb
+
+    def _dispatch(self):
+        """Start queued jobs in priority order while slots and memory allow"""
+        for job in sorted(self._queue, key=lambda j: (j.priority, j.sequence)):
+            if len(self._running) >= self.max_concurrent:
+                break
+            if not self._can_start(job):
+                continue
+            self._queue.remove(job)
+            self._running[job.job_id] = job
+            job.status = "running"
+            job.started_at = time.monotonic()
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        status = "completed"
+        try:
+            await job.run(job)
+        except (asyncio.CancelledError, JobCancelled):
+            status = "cancelled"
+        except Exception as e:
+            logger.error(f"Scheduled job {job.job_id} failed: {e}")
+            status = "failed"
+        finally:
+            self._running.pop(job.job_id, None)
+            if job.started_at is not None:
+                # Exponential moving average feeds the Retry-After estimate
+                elapsed = time.monotonic() - job.started_at
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            self._finish(job, status)
+            self._dispatch()
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        self.stats[status] += 1
+        # Keep finished jobs out of the registry so it stays bounded
+        self._jobs.pop(job.job_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "queued": len(self._queue),
+            "running": len(self._running),
+            "reserved_memory_mb": round(self.reserved_memory_mb, 1),
+            "memory_budget_mb": self.memory_budget_mb,
+            "max_concurrent": self.max_concurrent,
+            "avg_job_seconds": round(self._avg_job_seconds, 2),
+            "timestamp": datetime.now().isoformat()
+        }
@@ -0,0 +1,62 @@
+"""Single-flight registry: identical analysis requests share one job.
+
+The request that starts a job reserves its key synchronously, before its first
+await, so identical requests arriving together cannot each start their own.
+Until the job's record reaches the analysis store the reservation stands in
+for it.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlightRegistry:
+    """Canonical request key -> analysis_id of the queued or running job"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, str] = {}
+        # Reserved jobs whose record may not be in the store yet
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"submitted": 0, "started": 0, "coalesced": 0}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def find_running(self, key: str,
+                           fetch_record: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+                           ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(analysis_id, record) of the job to coalesce into, or None.
+
+        None is returned straight after a synchronous check that no job holds
+        the key, so the caller can ``reserve`` it before yielding to the loop.
+        """
+        while True:
+            running_id = self._in_flight.get(key)
+            if running_id is None:
+                return None
+            record = await fetch_record(running_id) or self._pending.get(running_id)
+            if (record or {}).get("status") == "processing":
+                self.stats["coalesced"] += 1
+                return running_id, record
+            # Finished (possibly on a worker this process never heard from)
+            self.release(key, running_id)
+
+    def reserve(self, key: str, analysis_id: str, record: Dict[str, Any]):
+        if key in self._in_flight:
+            raise RuntimeError(f"Request key already held by {self._in_flight[key]}")
+        self._in_flight[key] = analysis_id
+        self._pending[analysis_id] = dict(record)
+
+    def confirm(self, analysis_id: str):
+        """The job was stored and queued; the store is authoritative from now on"""
+        self._pending.pop(analysis_id, None)
+        self.stats["started"] += 1
+
+    def release(self, key: str, analysis_id: str):
+        if self._in_flight.get(key) == analysis_id:
+            del self._in_flight[key]
+        self._pending.pop(analysis_id, None)
+
+    def release_analysis(self, analysis_id: str):
+        """Free every key held by the analysis, e.g. when it is cancelled"""
+        for key, running_id in list(self._in_flight.items()):
+            if running_id == analysis_id:
+                self.release(key, analysis_id)
@@ -0,0 +1,105 @@
+"""Analysis state store shared between the API and analysis workers."""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryAnalysisStore:
+    """Process-local store used when analyses run inside the API process.
+
+    Records expire after ``ttl_seconds`` like the Redis store, and the least
+    recently updated ones are evicted beyond ``max_records``. Records of
+    queued or running analyses (status ``processing``) are never evicted.
+    """
+
+    def __init__(self, max_records: int = 1000, ttl_seconds: int = 7 * 24 * 3600):
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self.max_records = max_records
+        self.ttl_seconds = ttl_seconds
+
+    def _evict(self):
+        now = time.monotonic()
+        excess = len(self._records) - self.max_records
+        victims = []
+        # Records are ordered by last update, so expired ones sit at the front
+        for analysis_id, record in self._records.items():
+            if excess <= 0 and self._expires_at[analysis_id] > now:
+                break
+            if record.get("status") == "processing":
+                continue
+            victims.append(analysis_id)
+            excess -= 1
+        for analysis_id in victims:
+            del self._records[analysis_id]
+            del self._expires_at[analysis_id]
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        if self._expires_at.get(analysis_id, float("inf")) <= time.monotonic():
+            self._evict()
+        record = self._records.get(analysis_id)
+        return dict(record) if record is not None else None
+
+    def update(self, analysis_id: str, fields: Dict[str, Any]):
+        self._records.setdefault(analysis_id, {}).update(fields)
+        self._records.move_to_end(analysis_id)
+        self._expires_at[analysis_id] = time.monotonic() + self.ttl_seconds
+        self._evict()
+
+    async def aget(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return self.get(analysis_id)
+
+    async def aupdate(self, analysis_id: str, fields: Dict[str, Any]):
+        self.update(analysis_id, fields)
+
+
+class RedisAnalysisStore:
+    """Redis-backed store so separate worker processes can publish results.
+
+    Each analysis is a hash whose fields hold JSON-encoded values, so API and
+    worker writes to different fields never overwrite each other.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "geoai:analysis:", ttl_seconds: int = 7 * 24 * 3600):
+        import redis
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self._prefix = prefix
+        self._ttl_seconds = ttl_seconds
+
+    def _key(self, analysis_id: str) -> str:
+        return f"{self._prefix}{analysis_id}"
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.hgetall(self._key(analysis_id))
+        if not raw:
+            return None
+        return {field.decode(): json.loads(value) for field, value in raw.items()}
+
+    def update(self, analysis_id: str, fields: Dict[str, Any]):
+        key = self._key(analysis_id)
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={field: json.dumps(value, default=str) for field, value in fields.items()})
+        pipe.expire(key, self._ttl_seconds)
+        pipe.execute()
+
+    # The redis client blocks, so async callers (API handlers) run it in a thread
+    async def aget(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, analysis_id)
+
+    async def aupdate(self, analysis_id: str, fields: Dict[str, Any]):
+        await asyncio.to_thread(self.update, analysis_id, fields)
+
+
+def create_analysis_store(execution_mode: str, redis_url: str, max_records: int = 1000,
+                          ttl_seconds: int = 7 * 24 * 3600):
+    """Pick the store backing for the configured execution mode"""
+    if execution_mode == "celery":
+        logger.info(f"Using Redis analysis store at {redis_url}")
+        return RedisAnalysisStore(redis_url, ttl_seconds=ttl_seconds)
+    return InMemoryAnalysisStore(max_records=max_records, ttl_seconds=ttl_seconds)
@@ -0,0 +1,67 @@
+"""Checks for the per-pixel median reducers used by composites."""
+import numpy as np
+import pytest
+
+from compositing import MEDIAN_BINS, MedianReducer, StackMedianReducer
+
+
+def scene_stack(scene_count, shape=(3, 8, 8), cloud_fraction=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    stack = rng.uniform(0.0, 1.0, (scene_count, *shape)).astype(np.float32)
+    stack[rng.random(stack.shape) < cloud_fraction] = np.nan
+    # A pixel clouded in every scene
+    stack[:, :, 0, 0] = np.nan
+    return stack
+
+
+@pytest.mark.parametrize("scene_count", [1, 2, 5, 6])
+def test_stack_median_matches_nanmedian(scene_count):
+    stack = scene_stack(scene_count)
+    reducer = StackMedianReducer(stack.shape[1:], scene_count)
+    for block in stack:
+        reducer.add(block)
+    with np.errstate(all="ignore"), pytest.warns(RuntimeWarning):
+        expected = np.nanmedian(stack, axis=0)
+    np.testing.assert_allclose(reducer.result(), expected, rtol=1e-6, equal_nan=True)
+
+
+def test_stack_median_with_fewer_scenes_than_reserved():
+    stack = scene_stack(3)
+    reducer = StackMedianReducer(stack.shape[1:], 5)
+    for block in stack:
+        reducer.add(block)
+    with pytest.warns(RuntimeWarning):
+        expected = np.nanmedian(stack, axis=0)
+    np.testing.assert_allclose(reducer.result(), expected, rtol=1e-6, equal_nan=True)
+
+
+def test_stack_median_without_scenes_is_nan():
+    assert np.isnan(StackMedianReducer((2, 4, 4), 3).result()).all()
+
+
+def test_histogram_median_lies_between_middle_values():
+    stack = scene_stack(15, cloud_fraction=0.2, seed=1)
+    reducer = MedianReducer(stack.shape[1:])
+    for block in stack:
+        reducer.add(block)
+    result = reducer.result()
+    # NaN sorts last, so each pixel's valid values lead its column
+    ordered = np.sort(stack, axis=0)
+    valid = np.count_nonzero(~np.isnan(stack), axis=0)
+    np.testing.assert_array_equal(np.isnan(result), valid == 0)
+    has_data = valid > 0
+    lower = np.take_along_axis(ordered, ((valid - 1) // 2)[None], axis=0)[0]
+    upper = np.take_along_axis(ordered, np.minimum(valid // 2, len(stack) - 1)[None], axis=0)[0]
+    # Interpolated within the bin, so at most one bin width outside the middle pair
+    bin_width = 1.0 / MEDIAN_BINS
+    assert (result[has_data] >= lower[has_data] - bin_width).all()
+    assert (result[has_data] <= upper[has_data] + bin_width).all()
+
+
+def test_histogram_median_clips_out_of_range_values():
+    reducer = MedianReducer((1, 1, 2))
+    for values in ([-0.5, 2.0], [-0.2, 3.0], [-0.1, 4.0]):
+        reducer.add(np.array(values, dtype=np.float32).reshape(1, 1, 2))
+    low, high = reducer.result()[0, 0]
+    assert 0.0 <= low <= 1.0 / MEDIAN_BINS
+    assert 1.0 - 1.0 / MEDIAN_BINS <= high <= 1.0
@@ -0,0 +1,53 @@
+"""Checks for the geodesic bounding box and area helpers."""
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from geometry import GEOD, bbox_areas_km2, create_bounding_box, create_bounding_boxes, utm_epsg_for
+
+
+@pytest.mark.parametrize("lat, lon", [(-1.2921, 36.8219), (0.0, 0.0), (60.0, 10.0)])
+def test_bounding_box_edges_are_radius_away(lat, lon):
+    bbox = create_bounding_box(lat, lon, 10.0)
+    # Walk back from the centre to each edge midpoint along the ellipsoid
+    for edge_lon, edge_lat in [(lon, bbox["max_lat"]), (lon, bbox["min_lat"]),
+                               (bbox["max_lon"], lat), (bbox["min_lon"], lat)]:
+        _, _, distance = GEOD.inv(lon, lat, edge_lon, edge_lat)
+        assert distance == pytest.approx(10000.0, abs=1.0)
+
+
+def test_bounding_box_widens_in_degrees_away_from_equator():
+    equator = create_bounding_box(0.0, 10.0, 10.0)
+    north = create_bounding_box(60.0, 10.0, 10.0)
+    equator_span = equator["max_lon"] - equator["min_lon"]
+    assert north["max_lon"] - north["min_lon"] == pytest.approx(2 * equator_span, rel=0.01)
+
+
+def test_bounding_box_area_matches_square():
+    bbox = create_bounding_box(-1.2921, 36.8219, 10.0)
+    assert bbox["utm_epsg"] == 32737
+    assert bbox["area_km2"] == pytest.approx(400.0, rel=0.005)
+
+
+def test_batch_matches_scalar():
+    lats = np.array([-4.0435, -1.2921, 0.5204])
+    lons = np.array([39.6682, 36.8219, 35.2699])
+    boxes = create_bounding_boxes(lats, lons, 5.0)
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        single = create_bounding_box(lat, lon, 5.0)
+        for key, value in single.items():
+            assert boxes[key][i] == pytest.approx(value)
+
+
+def test_bbox_area_matches_ellipsoidal_area():
+    bounds = np.array([[36.0, -2.0, 37.0, -1.0], [34.0, 0.0, 34.5, 0.5], [40.0, 3.0, 41.0, 4.0]])
+    areas = bbox_areas_km2(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+    for (min_lon, min_lat, max_lon, max_lat), area in zip(bounds, areas):
+        expected, _ = GEOD.geometry_area_perimeter(box(min_lon, min_lat, max_lon, max_lat))
+        assert area == pytest.approx(abs(expected) / 1e6, rel=0.002)
+
+
+def test_utm_zone_selection():
+    assert utm_epsg_for(-1.2921, 36.8219) == 32737
+    assert utm_epsg_for(0.5204, 35.2699) == 32636
+    assert list(utm_epsg_for([1.0, -1.0], [39.0, 39.0])) == [32637, 32737]
@@ -0,0 +1,80 @@
+"""Checks for merging per-scene and per-tile partial aggregates."""
+import numpy as np
+import pytest
+
+from compositing import build_composite_grid
+from geometry import create_bounding_box
+from partials import INDEX_CLASSES, PartialAggregate, extent_masks, merge_statistics
+
+CLASSES = INDEX_CLASSES["NDVI"]
+
+
+def partial_of(values):
+    partial = PartialAggregate()
+    partial.add_values(np.asarray(values, dtype=np.float32), CLASSES)
+    return partial
+
+
+def test_merge_equals_single_pass():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-1.0, 1.0, 1000).astype(np.float32)
+    values[::17] = np.nan
+    merged = partial_of(values[:300]).merge(partial_of(values[300:]))
+    whole = partial_of(values)
+    assert merged.count == whole.count
+    assert merged.histogram == whole.histogram
+    assert merged.class_counts == whole.class_counts
+    assert merged.summary()["mean"] == pytest.approx(whole.summary()["mean"])
+    assert merged.summary()["std"] == pytest.approx(whole.summary()["std"])
+    assert (merged.minimum, merged.maximum) == (whole.minimum, whole.maximum)
+
+
+def test_merge_with_empty_partial():
+    partial = partial_of([0.1, 0.6])
+    merged = PartialAggregate().merge(partial)
+    assert merged.summary() == partial.summary()
+    assert PartialAggregate().merge(PartialAggregate()).summary() == {"count": 0}
+
+
+def test_from_summary_round_trips():
+    partial = partial_of(np.linspace(-0.9, 0.9, 200))
+    rebuilt = PartialAggregate.from_summary(partial.summary())
+    assert rebuilt.count == partial.count
+    assert rebuilt.total == pytest.approx(partial.total, abs=1e-9)
+    assert rebuilt.total_sq == pytest.approx(partial.total_sq)
+    assert rebuilt.histogram == partial.histogram
+    assert rebuilt.class_counts == partial.class_counts
+    assert PartialAggregate.from_summary({"count": 0}).count == 0
+
+
+def test_merge_statistics_combines_tiles():
+    west, east = np.linspace(-0.5, 0.2, 50), np.linspace(0.3, 0.9, 150)
+    tiles = [
+        {"index": "NDVI", "scenes_reused": 1, "scenes_computed": 2, **partial_of(west).summary()},
+        None,
+        {"index": "NDVI", "scenes_reused": 0, "scenes_computed": 3, **partial_of(east).summary()}
+    ]
+    merged = merge_statistics(tiles)
+    expected = partial_of(np.concatenate([west, east])).summary()
+    assert merged["index"] == "NDVI"
+    assert (merged["scenes_reused"], merged["scenes_computed"]) == (1, 5)
+    assert merged["count"] == expected["count"]
+    assert merged["mean"] == pytest.approx(expected["mean"])
+    assert merged["std"] == pytest.approx(expected["std"])
+    assert merged["histogram"] == expected["histogram"]
+    for name, percentage in expected["class_percentages"].items():
+        assert merged["class_percentages"][name] == pytest.approx(percentage)
+    assert merge_statistics([None, {}]) is None
+
+
+def test_extent_masks_partition_the_grid():
+    bbox = create_bounding_box(-1.2921, 36.8219, 2.0)
+    grid = build_composite_grid(bbox, 100)
+    middle = (bbox["min_lon"] + bbox["max_lon"]) / 2
+    # Slightly outside the bbox so edge pixels are covered
+    south, north = bbox["min_lat"] - 1, bbox["max_lat"] + 1
+    west = extent_masks(grid, (bbox["min_lon"] - 1, south, middle, north), 16)
+    east = extent_masks(grid, (middle, south, bbox["max_lon"] + 1, north), 16)
+    for west_mask, east_mask in zip(west, east):
+        assert not (west_mask & east_mask).any()
+        assert (west_mask | east_mask).all()
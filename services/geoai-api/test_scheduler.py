@@ -0,0 +1,170 @@
+"""Checks for the in-process analysis scheduler: lanes, admission and cancellation."""
+import asyncio
+
+import pytest
+
+from scheduler import AnalysisScheduler, JobTooLarge, SchedulerSaturated
+
+
+def recording_job(started, gate=None):
+    """Job factory that records its start and optionally waits on ``gate``"""
+    async def run(job):
+        started.append(job.job_id)
+        if gate is not None:
+            await gate.wait()
+    return run
+
+
+async def drain(scheduler):
+    while scheduler.snapshot()["queued"] or scheduler.snapshot()["running"]:
+        await asyncio.sleep(0)
+
+
+def test_lanes_run_in_priority_order():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=1)
+        started, gate = [], asyncio.Event()
+        scheduler.submit("blocker", "change_detection", recording_job(started, gate))
+        scheduler.submit("explore", "change_detection", recording_job(started), priority="exploration")
+        scheduler.submit("standard", "change_detection", recording_job(started))
+        scheduler.submit("alert", "change_detection", recording_job(started), priority="alert")
+        gate.set()
+        await drain(scheduler)
+        return started
+
+    assert asyncio.run(scenario()) == ["blocker", "alert", "standard", "explore"]
+
+
+def test_promote_moves_queued_job_ahead():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=1)
+        started, gate = [], asyncio.Event()
+        scheduler.submit("blocker", "change_detection", recording_job(started, gate))
+        scheduler.submit("explore", "change_detection", recording_job(started), priority="exploration")
+        scheduler.submit("standard", "change_detection", recording_job(started))
+        promoted = scheduler.promote("explore", "alert")
+        # Never demoted, and running jobs stay where they are
+        assert not scheduler.promote("standard", "exploration")
+        assert not scheduler.promote("blocker", "alert")
+        gate.set()
+        await drain(scheduler)
+        return promoted, started
+
+    promoted, started = asyncio.run(scenario())
+    assert promoted
+    assert started == ["blocker", "explore", "standard"]
+
+
+def test_type_limit_holds_back_same_type():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=4, type_limits={"grid": 1})
+        started, gate = [], asyncio.Event()
+        scheduler.submit("grid-1", "grid", recording_job(started, gate))
+        scheduler.submit("grid-2", "grid", recording_job(started))
+        scheduler.submit("other", "change_detection", recording_job(started))
+        await asyncio.sleep(0)
+        before = list(started)
+        gate.set()
+        await drain(scheduler)
+        return before, started
+
+    before, started = asyncio.run(scenario())
+    assert before == ["grid-1", "other"]
+    assert started[-1] == "grid-2"
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=1, max_queued=1)
+        gate = asyncio.Event()
+        scheduler.submit("running", "change_detection", recording_job([], gate))
+        scheduler.submit("queued", "change_detection", recording_job([]))
+        with pytest.raises(SchedulerSaturated) as rejected:
+            scheduler.submit("rejected", "change_detection", recording_job([]))
+        gate.set()
+        await drain(scheduler)
+        return scheduler, rejected.value
+
+    scheduler, rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    assert scheduler.stats["rejected"] == 1
+    assert scheduler.stats["completed"] == 2
+
+
+def test_job_above_memory_budget_is_too_large():
+    scheduler = AnalysisScheduler(memory_budget_mb=100.0)
+    with pytest.raises(JobTooLarge):
+        scheduler.submit("huge", "change_detection", recording_job([]), memory_mb=150.0)
+    assert scheduler.stats["rejected"] == 1
+    assert scheduler.get("huge") is None
+
+
+def test_memory_budget_serialises_large_jobs():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=4, memory_budget_mb=100.0)
+        started, gate = [], asyncio.Event()
+        scheduler.submit("first", "change_detection", recording_job(started, gate), memory_mb=60.0)
+        scheduler.submit("second", "change_detection", recording_job(started), memory_mb=60.0)
+        await asyncio.sleep(0)
+        before = list(started)
+        gate.set()
+        await drain(scheduler)
+        return before, started
+
+    before, started = asyncio.run(scenario())
+    assert before == ["first"]
+    assert started == ["first", "second"]
+
+
+def test_cancel_queued_job_never_runs():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrent=1)
+        started, gate = [], asyncio.Event()
+        scheduler.submit("blocker", "change_detection", recording_job(started, gate))
+        scheduler.submit("queued", "change_detection", recording_job(started))
+        previous = scheduler.cancel("queued")
+        gate.set()
+        await drain(scheduler)
+        return scheduler, previous, started
+
+    scheduler, previous, started = asyncio.run(scenario())
+    assert previous == "queued"
+    assert started == ["blocker"]
+    assert scheduler.stats["cancelled"] == 1
+    assert scheduler.cancel("queued") is None
+
+
+def test_cancel_running_job_interrupts_it():
+    async def scenario():
+        scheduler = AnalysisScheduler()
+        job = scheduler.submit("running", "change_detection", recording_job([], asyncio.Event()))
+        await asyncio.sleep(0)
+        previous = scheduler.cancel("running")
+        await drain(scheduler)
+        return scheduler, job, previous
+
+    scheduler, job, previous = asyncio.run(scenario())
+    assert previous == "running"
+    assert job.status == "cancelled"
+    assert scheduler.stats["cancelled"] == 1
+
+
+def test_cancelled_cpu_stage_stops_at_check():
+    async def scenario():
+        scheduler = AnalysisScheduler()
+        blocks = []
+
+        async def run(job):
+            for block in range(100):
+                job.check_cancelled()
+                blocks.append(block)
+                if block == 2:
+                    job.cancel_requested = True
+
+        job = scheduler.submit("cpu", "change_detection", run)
+        await drain(scheduler)
+        return job, blocks
+
+    job, blocks = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert blocks == [0, 1, 2]
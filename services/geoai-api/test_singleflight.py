@@ -0,0 +1,87 @@
+"""Checks for single-flight coalescing of identical analysis requests."""
+import asyncio
+import uuid
+
+import pytest
+
+from singleflight import SingleFlightRegistry
+
+
+def store_reader(records):
+    async def fetch(analysis_id):
+        # Yield like a real store read so concurrent requests interleave
+        await asyncio.sleep(0)
+        return records.get(analysis_id)
+    return fetch
+
+
+async def start(registry, records, key):
+    """The /analyze flow: coalesce, or reserve, store and confirm a new job"""
+    running = await registry.find_running(key, store_reader(records))
+    if running is not None:
+        return running[0]
+    analysis_id = uuid.uuid4().hex
+    record = {"status": "processing"}
+    registry.reserve(key, analysis_id, record)
+    await asyncio.sleep(0)
+    records[analysis_id] = record
+    registry.confirm(analysis_id)
+    return analysis_id
+
+
+def test_concurrent_identical_requests_share_one_job():
+    async def scenario():
+        registry, records = SingleFlightRegistry(), {}
+        return registry, await asyncio.gather(*[start(registry, records, "key") for _ in range(10)])
+
+    registry, ids = asyncio.run(scenario())
+    assert len(set(ids)) == 1
+    assert registry.stats["started"] == 1
+    assert registry.stats["coalesced"] == 9
+
+
+def test_reserved_job_is_found_before_it_is_stored():
+    async def scenario():
+        registry = SingleFlightRegistry()
+        registry.reserve("key", "a1", {"status": "processing"})
+        return await registry.find_running("key", store_reader({}))
+
+    assert asyncio.run(scenario()) == ("a1", {"status": "processing"})
+
+
+def test_finished_job_frees_its_key():
+    async def scenario():
+        registry = SingleFlightRegistry()
+        records = {"a1": {"status": "completed"}}
+        registry.reserve("key", "a1", {"status": "processing"})
+        registry.confirm("a1")
+        return registry, await registry.find_running("key", store_reader(records))
+
+    registry, running = asyncio.run(scenario())
+    assert running is None
+    assert len(registry) == 0
+
+
+def test_key_cannot_be_reserved_twice():
+    registry = SingleFlightRegistry()
+    registry.reserve("key", "a1", {"status": "processing"})
+    with pytest.raises(RuntimeError):
+        registry.reserve("key", "a2", {"status": "processing"})
+
+
+def test_release_only_frees_the_holder():
+    registry = SingleFlightRegistry()
+    registry.reserve("key", "a1", {"status": "processing"})
+    registry.release("key", "other")
+    assert len(registry) == 1
+    registry.release("key", "a1")
+    assert len(registry) == 0
+
+
+def test_release_analysis_frees_every_key():
+    registry = SingleFlightRegistry()
+    registry.reserve("key-1", "a1", {"status": "processing"})
+    registry.reserve("key-2", "a1", {"status": "processing"})
+    registry.reserve("key-3", "a2", {"status": "processing"})
+    registry.release_analysis("a1")
+    assert len(registry) == 1
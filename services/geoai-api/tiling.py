@@ -0,0 +1,355 @@
+"""Tiled grid analysis: split a large area into a fixed tile grid, run an
+analyzer per tile in a process pool and stitch the tiles back together."""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+
+import numpy as np
+import rasterio
+import shapely
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+from rasterio.warp import reproject, Resampling
+from rasterio.windows import Window
+from shapely.geometry import mapping, shape
+from shapely.ops import unary_union
+
+from geometry import GEOD, bbox_areas_km2, utm_epsg_for
+from partials import merge_statistics
+
+logger = logging.getLogger(__name__)
+
+# Kenya's outline (Natural Earth 1:110m), used when a grid request names the whole country
+KENYA_BOUNDARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kenya_boundary.geojson")
+
+# Result keys that are additive across tiles; other numbers are area-weighted means
+ADDITIVE_RESULT_KEYS = ("km2", "tonnes", "new_developments", "infrastructure_gaps")
+
+_tile_executor: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class TileSpec:
+    tile_id: str
+    row: int
+    col: int
+    # Core extent (lon/lat) the tile is responsible for in the mosaic
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+    halo_km: float
+    # Share of the core that lies inside the requested area, in km²
+    weight_km2: float
+    # GeoJSON of the core clipped to the area; None when the core lies wholly inside it
+    clip: Optional[Dict[str, Any]] = None
+
+
+@lru_cache(maxsize=1)
+def kenya_boundary():
+    """Kenya's national boundary as a shapely geometry"""
+    with open(KENYA_BOUNDARY_PATH) as f:
+        features = json.load(f)["features"]
+    return unary_union([shape(feature["geometry"]) for feature in features])
+
+
+def get_tile_workers() -> int:
+    return int(os.getenv("GEOAI_TILE_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def get_tile_executor() -> ProcessPoolExecutor:
+    """Shared process pool; spawn keeps children clear of the API's threads"""
+    global _tile_executor
+    if _tile_executor is None:
+        _tile_executor = ProcessPoolExecutor(
+            max_workers=get_tile_workers(), mp_context=multiprocessing.get_context("spawn")
+        )
+    return _tile_executor
+
+
+def area_geometry(area: Optional[Dict[str, Any]]):
+    """Shapely geometry of a GeoJSON area; None means all of Kenya"""
+    return shape(area) if area is not None else kenya_boundary()
+
+
+def count_grid_cells(area: Optional[Dict[str, Any]], tile_size_deg: float) -> int:
+    """Cells of the aligned grid over the area's bounds: an upper bound on the tile count"""
+    min_lon, min_lat, max_lon, max_lat = area_geometry(area).bounds
+    columns = math.ceil(max_lon / tile_size_deg) - math.floor(min_lon / tile_size_deg)
+    rows = math.ceil(max_lat / tile_size_deg) - math.floor(min_lat / tile_size_deg)
+    return max(0, columns) * max(0, rows)
+
+
+def build_tile_grid(area: Optional[Dict[str, Any]], tile_size_deg: float, halo_km: float) -> List[TileSpec]:
+    """Tiles of a fixed, globally aligned grid that intersect the area.
+
+    ``area`` is a GeoJSON geometry; None means all of Kenya. Alignment to
+    multiples of ``tile_size_deg`` keeps tile IDs stable between requests.
+    """
+    region = area_geometry(area)
+    min_lon, min_lat, max_lon, max_lat = region.bounds
+    cols = np.arange(math.floor(min_lon / tile_size_deg), math.ceil(max_lon / tile_size_deg))
+    rows = np.arange(math.floor(min_lat / tile_size_deg), math.ceil(max_lat / tile_size_deg))
+    row_index, col_index = (grid.ravel() for grid in np.meshgrid(rows, cols, indexing="ij"))
+
+    # Vectorized intersection tests against the prepared region
+    cores = shapely.box(col_index * tile_size_deg, row_index * tile_size_deg,
+                        (col_index + 1) * tile_size_deg, (row_index + 1) * tile_size_deg)
+    shapely.prepare(region)
+    hits = shapely.intersects(cores, region)
+    if not hits.any():
+        return []
+    cores, row_index, col_index = cores[hits], row_index[hits], col_index[hits]
+    clipped = shapely.intersection(cores, region)
+    fractions = shapely.area(clipped) / shapely.area(cores)
+    inside = shapely.contains(region, cores)
+
+    # One batched geodesic area call for every tile core
+    bounds = shapely.bounds(cores)
+    core_km2 = bbox_areas_km2(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+    return [
+        TileSpec(
+            tile_id=f"r{row}_c{col}",
+            row=int(row),
+            col=int(col),
+            min_lon=float(tile_bounds[0]),
+            min_lat=float(tile_bounds[1]),
+            max_lon=float(tile_bounds[2]),
+            max_lat=float(tile_bounds[3]),
+            halo_km=halo_km,
+            weight_km2=float(area_km2 * fraction),
+            clip=None if is_inside else mapping(clip)
+        )
+        for row, col, tile_bounds, area_km2, fraction, clip, is_inside
+        in zip(row_index, col_index, bounds, core_km2, fractions, clipped, inside)
+    ]
+
+
+def tile_processing_bbox(tile: TileSpec) -> Dict[str, Any]:
+    """Tile extent grown by its halo, in the bbox format used by the pipeline"""
+    centre_lon = (tile.min_lon + tile.max_lon) / 2
+    centre_lat = (tile.min_lat + tile.max_lat) / 2
+    halo_m = tile.halo_km * 1000.0
+    _, max_lat, _ = GEOD.fwd(centre_lon, tile.max_lat, 0.0, halo_m)
+    _, min_lat, _ = GEOD.fwd(centre_lon, tile.min_lat, 180.0, halo_m)
+    # Widest longitude step happens at the latitude furthest from the equator
+    edge_lat = tile.max_lat if abs(tile.max_lat) > abs(tile.min_lat) else tile.min_lat
+    max_lon, _, _ = GEOD.fwd(tile.max_lon, edge_lat, 90.0, halo_m)
+    min_lon, _, _ = GEOD.fwd(tile.min_lon, edge_lat, 270.0, halo_m)
+    return {
+        "min_lat": float(min_lat),
+        "max_lat": float(max_lat),
+        "min_lon": float(min_lon),
+        "max_lon": float(max_lon),
+        "utm_epsg": utm_epsg_for(centre_lat, centre_lon),
+        "area_km2": float(bbox_areas_km2(min_lon, min_lat, max_lon, max_lat)[0])
+    }
+
+
+def run_tile(analysis_id: str, tile_data: Dict[str, Any], request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Process-pool entry point: composite and analyze one tile"""
+    return asyncio.run(_run_tile(analysis_id, TileSpec(**tile_data), request_data))
+
+
+async def _run_tile(analysis_id: str, tile: TileSpec, request_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Imported lazily: the pool spawns fresh interpreters that only need the pipeline
+    from main import (
+        ANALYZERS, AnalysisRequest, create_temporal_composite, create_temporal_statistics,
+        download_satellite_data
+    )
+
+    bbox = tile_processing_bbox(tile)
+    centre_lat = (tile.min_lat + tile.max_lat) / 2
+    centre_lon = (tile.min_lon + tile.max_lon) / 2
+    tile_request = AnalysisRequest(
+        region_name=f"{request_data['region_name']} {tile.tile_id}",
+        latitude=centre_lat,
+        longitude=centre_lon,
+        radius_km=math.sqrt(bbox["area_km2"]) / 2,
+        start_date=request_data["start_date"],
+        end_date=request_data["end_date"],
+        analysis_type=request_data["analysis_type"],
+        satellite_source=request_data["satellite_source"],
+        cloud_cover=request_data["cloud_cover"],
+        composite_method=request_data["composite_method"]
+    )
+
+    satellite_data = await download_satellite_data(
+        latitude=centre_lat,
+        longitude=centre_lon,
+        start_date=tile_request.start_date,
+        end_date=tile_request.end_date,
+        satellite_source=tile_request.satellite_source,
+        radius_km=tile_request.radius_km,
+        cloud_cover=tile_request.cloud_cover,
+        bbox=bbox
+    )
+    satellite_data["resolution"] = request_data["resolution_m"]
+    satellite_data["composite"] = await create_temporal_composite(
+        f"{analysis_id}_{tile.tile_id}", satellite_data, tile_request.composite_method
+    )
+    # Statistics cover the core only, so pixels in overlapping halos are counted once when merged,
+    # and only its part inside the requested area
+    satellite_data["temporal_statistics"] = await create_temporal_statistics(
+        f"{analysis_id}_{tile.tile_id}", satellite_data, tile_request.analysis_type,
+        extent=(tile.min_lon, tile.min_lat, tile.max_lon, tile.max_lat),
+        clip=shape(tile.clip) if tile.clip is not None else None
+    )
+    results = await ANALYZERS[tile_request.analysis_type](satellite_data, tile_request)
+    if satellite_data["temporal_statistics"] is not None:
+        results["temporal_statistics"] = satellite_data["temporal_statistics"]
+    return {
+        "tile": asdict(tile),
+        "composite": satellite_data["composite"],
+        "results": results
+    }
+
+
+async def run_tiles(analysis_id: str, tiles: List[TileSpec], request_data: Dict[str, Any],
+                    cancel_check=None, max_parallel: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run tiles on the process pool, at most ``max_parallel`` at once, polling for cancellation"""
+    loop = asyncio.get_running_loop()
+    executor = get_tile_executor()
+    # Bounds the memory this grid holds; the scheduler reserved max_parallel tile peaks
+    slots = asyncio.Semaphore(max_parallel or get_tile_workers())
+
+    async def run_one(tile: TileSpec) -> Dict[str, Any]:
+        async with slots:
+            if cancel_check is not None:
+                cancel_check()
+            return await loop.run_in_executor(executor, run_tile, analysis_id, asdict(tile), request_data)
+
+    futures = [asyncio.ensure_future(run_one(tile)) for tile in tiles]
+    tile_outputs = []
+    try:
+        for future in asyncio.as_completed(futures):
+            tile_outputs.append(await future)
+            if cancel_check is not None:
+                cancel_check()
+    except BaseException:
+        # Drop tiles that have not started yet; running ones finish on their own
+        for future in futures:
+            future.cancel()
+        raise
+    return sorted(tile_outputs, key=lambda output: (output["tile"]["row"], output["tile"]["col"]))
+
+
+def stitch_mosaic(tile_outputs: List[Dict[str, Any]], output_path: str, resolution_deg: float) -> Optional[Dict[str, Any]]:
+    """Reproject each tile's core (halo excluded, clipped to the area) into one lon/lat mosaic"""
+    composites = [(output["tile"], output["composite"]) for output in tile_outputs if output["composite"]]
+    if not composites:
+        return None
+
+    min_lon = min(tile["min_lon"] for tile, _ in composites)
+    min_lat = min(tile["min_lat"] for tile, _ in composites)
+    max_lon = max(tile["max_lon"] for tile, _ in composites)
+    max_lat = max(tile["max_lat"] for tile, _ in composites)
+    width = int(round((max_lon - min_lon) / resolution_deg))
+    height = int(round((max_lat - min_lat) / resolution_deg))
+    transform = from_origin(min_lon, max_lat, resolution_deg, resolution_deg)
+
+    with rasterio.open(composites[0][1]["composite_path"]) as first:
+        count = first.count
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    profile = {
+        "driver": "GTiff",
+        "dtype": "float32",
+        "count": count,
+        "width": width,
+        "height": height,
+        "crs": CRS.from_epsg(4326),
+        "transform": transform,
+        "nodata": np.nan,
+        "tiled": True,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "compress": "deflate",
+        "BIGTIFF": "IF_SAFER"
+    }
+    with rasterio.open(output_path, "w", **profile) as dst:
+        for tile, composite in composites:
+            col_off = int(round((tile["min_lon"] - min_lon) / resolution_deg))
+            row_off = int(round((max_lat - tile["max_lat"]) / resolution_deg))
+            core_width = min(width - col_off, int(round((tile["max_lon"] - tile["min_lon"]) / resolution_deg)))
+            core_height = min(height - row_off, int(round((tile["max_lat"] - tile["min_lat"]) / resolution_deg)))
+            window = Window(col_off, row_off, core_width, core_height)
+            destination = np.full((count, core_height, core_width), np.nan, dtype=np.float32)
+            with rasterio.open(composite["composite_path"]) as src:
+                reproject(
+                    source=rasterio.band(src, list(range(1, count + 1))),
+                    destination=destination,
+                    dst_transform=dst.window_transform(window),
+                    dst_crs=dst.crs,
+                    dst_nodata=np.nan,
+                    resampling=Resampling.bilinear
+                )
+            if tile.get("clip") is not None:
+                # Pixels of the core outside the requested area stay nodata
+                window_transform = dst.window_transform(window)
+                rows, cols = np.mgrid[0:core_height, 0:core_width]
+                lons = window_transform.c + (cols + 0.5) * window_transform.a
+                lats = window_transform.f + (rows + 0.5) * window_transform.e
+                destination[:, ~shapely.intersects_xy(shape(tile["clip"]), lons, lats)] = np.nan
+            dst.write(destination, window=window)
+
+    return {"mosaic_path": output_path, "width": width, "height": height, "resolution_deg": resolution_deg}
+
+
+def aggregate_tile_results(tile_outputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-tile analyzer outputs, weighting by each tile's area"""
+    weighted = [
+        (output["tile"]["weight_km2"],
+         {k: v for k, v in output["results"].items() if k != "temporal_statistics"})
+        for output in tile_outputs
+    ]
+    aggregate = _aggregate(weighted)
+    # Index statistics carry their own counts, so they merge exactly instead of by area
+    statistics = merge_statistics([output["results"].get("temporal_statistics") for output in tile_outputs])
+    if statistics is not None:
+        aggregate["temporal_statistics"] = statistics
+    return aggregate
+
+
+def _aggregate(weighted: List[Tuple[float, Any]], key: str = "") -> Any:
+    values = [(weight, value) for weight, value in weighted if value is not None]
+    if not values:
+        return None
+    sample = values[0][1]
+
+    if isinstance(sample, dict):
+        keys = list(dict.fromkeys(k for _, value in values if isinstance(value, dict) for k in value))
+        return {
+            k: _aggregate([(w, v.get(k)) for w, v in values if isinstance(v, dict)], k)
+            for k in keys
+        }
+    if isinstance(sample, bool) or not isinstance(sample, (int, float)):
+        if isinstance(sample, list):
+            # Union in first-seen order, e.g. detected change classes
+            merged = []
+            for _, value in values:
+                for item in value if isinstance(value, list) else [value]:
+                    if item not in merged:
+                        merged.append(item)
+            return merged
+        # Categorical values: the label covering the most area wins
+        votes = Counter()
+        for weight, value in values:
+            votes[str(value)] += weight
+        return votes.most_common(1)[0][0]
+
+    numbers = [(w, float(v)) for w, v in values if isinstance(v, (int, float))]
+    if any(part in key for part in ADDITIVE_RESULT_KEYS):
+        return sum(v for _, v in numbers)
+    total_weight = sum(w for w, _ in numbers)
+    if total_weight <= 0:
+        return float(np.mean([v for _, v in numbers]))
+    return sum(w * v for w, v in numbers) / total_weight
@@ -0,0 +1,220 @@
+"""Polygonized vector outputs for class rasters.
+
+Class rasters derived from the composite are sieved and polygonized with
+``rasterio.features.shapes``, simplified once per zoom level and written as
+newline-delimited GeoJSON (with a byte-offset bbox index) and FlatGeobuf, so
+bbox subsets can be streamed without building one large JSON document.
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+
+import numpy as np
+import rasterio
+import shapely
+from rasterio.enums import Resampling
+from rasterio.features import shapes, sieve
+from shapely.geometry import mapping, shape
+
+from compositing import CompositeGrid, Scene, SceneReader
+from geometry import WGS84, get_transformer
+from partials import INDEX_BANDS
+
+logger = logging.getLogger(__name__)
+
+VECTOR_ZOOMS = (6, 8, 10, 12, 14)
+
+# Class value -> name for each vectorized analysis (0 is background)
+VECTOR_CLASSES = {
+    "land_cover_classification": {1: "Water", 2: "Bare Soil", 3: "Sparse Vegetation", 4: "Dense Vegetation"},
+    "water_body_detection": {1: "Water"},
+    "change_detection": {1: "Vegetation Loss", 2: "Vegetation Gain"}
+}
+
+# Fields of the ``.idx.npy`` sidecar: feature bbox, then byte offset and length in the .ndjson
+INDEX_FIELDS = ("min_lon", "min_lat", "max_lon", "max_lat", "offset", "length")
+
+# Web Mercator ground resolution at the equator, zoom 0 (metres per pixel)
+EQUATOR_RESOLUTION_M = 156543.03392
+
+
+def _normalised_difference(block: np.ndarray, bands: List[str], pair: Tuple[str, str]) -> np.ndarray:
+    positive, negative = block[bands.index(pair[0])], block[bands.index(pair[1])]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (positive - negative) / (positive + negative)
+
+
+def classify_composite(analysis_type: str, satellite_data: Dict[str, Any], grid: CompositeGrid,
+                       output_path: str, block_size: int,
+                       cancel_check: Optional[Callable[[], None]] = None) -> str:
+    """Write a uint8 class raster for the analysis, block by block"""
+    bands = satellite_data["bands"]
+    index_bands = INDEX_BANDS.get(satellite_data["satellite_source"], INDEX_BANDS["sentinel-2"])
+    composite_path = satellite_data["composite"]["composite_path"]
+    scenes = [Scene(**scene) for scene in satellite_data["scenes"]]
+
+    profile = {
+        "driver": "GTiff", "dtype": "uint8", "count": 1, "nodata": 0,
+        "width": grid.width, "height": grid.height, "crs": grid.crs, "transform": grid.transform,
+        "tiled": True, "blockxsize": block_size, "blockysize": block_size, "compress": "deflate"
+    }
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with rasterio.open(composite_path) as src, rasterio.open(output_path, "w", **profile) as dst, \
+            SceneReader(grid) as reader:
+        for window in grid.windows(block_size):
+            if cancel_check is not None:
+                cancel_check()
+            classes = np.zeros((int(window.height), int(window.width)), dtype=np.uint8)
+            if analysis_type == "change_detection":
+                # Earliest vs latest scene in the window
+                before = _normalised_difference(reader.read(scenes[0], window), bands, index_bands["NDVI"])
+                after = _normalised_difference(reader.read(scenes[-1], window), bands, index_bands["NDVI"])
+                delta = after - before
+                classes[delta < -0.2] = 1
+                classes[delta > 0.2] = 2
+            else:
+                block = src.read(window=window)
+                ndwi = _normalised_difference(block, bands, index_bands["NDWI"])
+                if analysis_type == "water_body_detection":
+                    classes[ndwi > 0] = 1
+                else:
+                    ndvi = _normalised_difference(block, bands, index_bands["NDVI"])
+                    classes[ndvi < 0.2] = 2
+                    classes[(ndvi >= 0.2) & (ndvi < 0.5)] = 3
+                    classes[ndvi >= 0.5] = 4
+                    classes[ndwi > 0] = 1
+            dst.write(classes, 1, window=window)
+    return output_path
+
+
+def zoom_tolerance_m(zoom: int, latitude: float) -> float:
+    """Half a screen pixel at ``zoom``: detail below this is invisible"""
+    return EQUATOR_RESOLUTION_M * math.cos(math.radians(latitude)) / (2 ** zoom) / 2
+
+
+def polygonize(class_path: str, class_names: Dict[int, str], output_dir: str,
+               min_area_m2: float, zooms: Tuple[int, ...] = VECTOR_ZOOMS,
+               max_pixels: Optional[int] = None) -> Dict[str, Any]:
+    """Polygonize a projected class raster into per-zoom NDJSON and FlatGeobuf files.
+
+    Sieving and polygonizing need the whole raster in memory; rasters above
+    ``max_pixels`` are read at a coarser resolution (majority class per cell).
+    """
+    import fiona
+
+    os.makedirs(output_dir, exist_ok=True)
+    with rasterio.open(class_path) as src:
+        factor = 1
+        if max_pixels is not None and src.width * src.height > max_pixels:
+            factor = math.ceil(math.sqrt(src.width * src.height / max_pixels))
+        out_shape = (max(1, src.height // factor), max(1, src.width // factor))
+        classes = src.read(1, out_shape=out_shape, resampling=Resampling.mode)
+        transform = src.transform * src.transform.scale(src.width / out_shape[1], src.height / out_shape[0])
+        crs = src.crs.to_string()
+        centre = src.xy(src.height // 2, src.width // 2)
+    if factor > 1:
+        logger.info(f"Polygonizing {class_path} at 1/{factor} resolution to stay within {max_pixels} pixels")
+
+    pixel_area_m2 = abs(transform.a * transform.e)
+    min_pixels = max(1, int(math.ceil(min_area_m2 / pixel_area_m2)))
+    # Merge clumps below the area threshold into their neighbours before polygonizing
+    if min_pixels > 1:
+        classes = sieve(classes, size=min_pixels, mask=classes > 0)
+
+    to_wgs84 = get_transformer(crs, WGS84)
+    _, centre_lat = to_wgs84.transform(*centre)
+    reproject_coords = lambda coords: np.column_stack(to_wgs84.transform(coords[:, 0], coords[:, 1]))
+
+    schema = {"geometry": "Polygon", "properties": {"class": "str", "area_km2": "float"}}
+    ndjson_files = {z: open(os.path.join(output_dir, f"z{z}.ndjson"), "wb") for z in zooms}
+    fgb_files = {
+        z: fiona.open(os.path.join(output_dir, f"z{z}.fgb"), "w", driver="FlatGeobuf", crs=WGS84, schema=schema)
+        for z in zooms
+    }
+    index_rows = {z: [] for z in zooms}
+    offsets = {z: 0 for z in zooms}
+    feature_counts = {z: 0 for z in zooms}
+    filtered = 0
+    try:
+        for geometry, value in shapes(classes, mask=classes > 0, transform=transform):
+            polygon = shape(geometry)
+            if polygon.area < min_area_m2:
+                filtered += 1
+                continue
+            properties = {"class": class_names.get(int(value), str(int(value))), "area_km2": polygon.area / 1e6}
+            for z in zooms:
+                tolerance = zoom_tolerance_m(z, centre_lat)
+                simplified = polygon.simplify(tolerance, preserve_topology=True)
+                # Drop features smaller than a screen pixel at this zoom
+                if simplified.is_empty or simplified.area < (2 * tolerance) ** 2:
+                    continue
+                lonlat = shapely.transform(simplified, reproject_coords)
+                feature = {"type": "Feature", "geometry": mapping(lonlat), "properties": properties}
+                line = (json.dumps(feature, separators=(",", ":")) + "\n").encode()
+                ndjson_files[z].write(line)
+                index_rows[z].append((*lonlat.bounds, offsets[z], len(line)))
+                offsets[z] += len(line)
+                fgb_files[z].write(feature)
+                feature_counts[z] += 1
+    finally:
+        for f in ndjson_files.values():
+            f.close()
+        for f in fgb_files.values():
+            f.close()
+
+    for z in zooms:
+        np.save(os.path.join(output_dir, f"z{z}.idx.npy"),
+                np.array(index_rows[z], dtype=np.float64).reshape(-1, len(INDEX_FIELDS)))
+
+    return {
+        "vector_dir": output_dir,
+        "zooms": list(zooms),
+        "feature_counts": {str(z): n for z, n in feature_counts.items()},
+        "filtered_small_polygons": filtered,
+        "min_area_m2": min_area_m2,
+        "resolution_m": abs(transform.a),
+        "downsampled_by": factor,
+        "classes": list(class_names.values())
+    }
+
+
+def nearest_zoom(zooms: List[int], requested: Optional[int]) -> int:
+    """Finest precomputed zoom not above the requested one"""
+    if requested is None:
+        return max(zooms)
+    candidates = [z for z in zooms if z <= requested]
+    return max(candidates) if candidates else min(zooms)
+
+
+@lru_cache(maxsize=32)
+def _load_index(index_path: str, modified: float):
+    rows = np.load(index_path)
+    boxes = shapely.box(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]) if len(rows) else np.array([])
+    return rows, shapely.STRtree(boxes)
+
+
+def iter_features(output_dir: str, zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None,
+                  chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield NDJSON bytes for one zoom, optionally only features hitting ``bbox``"""
+    ndjson_path = os.path.join(output_dir, f"z{zoom}.ndjson")
+    if bbox is None:
+        with open(ndjson_path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    index_path = os.path.join(output_dir, f"z{zoom}.idx.npy")
+    rows, tree = _load_index(index_path, os.path.getmtime(index_path))
+    if not len(rows):
+        return
+    # Read hits in file order so the disk access stays sequential
+    hits = np.sort(tree.query(shapely.box(*bbox)))
+    with open(ndjson_path, "rb") as f:
+        for i in hits:
+            f.seek(int(rows[i, 4]))
+            yield f.read(int(rows[i, 5]))
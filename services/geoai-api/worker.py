@@ -0,0 +1,117 @@
+"""Celery worker entry point for distributed analysis execution.
+
+Start workers with::
+
+    GEOAI_EXECUTION_MODE=celery celery -A worker worker --loglevel=info
+
+and run the API with the same ``GEOAI_EXECUTION_MODE`` and ``REDIS_URL`` so
+``/analyze`` enqueues work here instead of running it in-process.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from celery import Celery
+from celery.signals import task_failure
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+celery_app = Celery("geoai", broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    # Analyses are long and memory heavy: hand out one at a time per worker process
+    worker_prefetch_multiplier=1,
+    # Acked after running, so a worker shut down mid-task hands it back. A task whose
+    # process is killed (e.g. by the OOM killer) is not requeued: it would only be
+    # killed again on the next worker, so it is marked failed instead.
+    task_acks_late=True,
+    task_reject_on_worker_lost=False,
+    task_default_priority=3,
+    broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    result_expires=24 * 3600
+)
+
+
+def queued_analysis_count() -> int:
+    """Analyses waiting on the broker, across every priority, not yet taken by a worker"""
+    queue = celery_app.conf.task_default_queue
+    with celery_app.connection_for_read() as connection:
+        return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+
+
+class StoreCancellation:
+    """Cancellation check for worker analyses, polling the shared store's status.
+
+    Plays the role of the scheduler's ``Job`` in ``run_ai_analysis``: the API's
+    ``DELETE /analysis/{id}`` marks the record cancelled and the next check here
+    raises ``JobCancelled``. Checks run often, so the store is read at most
+    once per ``interval`` seconds.
+    """
+
+    def __init__(self, store, analysis_id: str, interval: float = 2.0):
+        self.store = store
+        self.analysis_id = analysis_id
+        self.interval = interval
+        self._last_poll = float("-inf")
+        self._lock = threading.Lock()
+
+    def check_cancelled(self):
+        from scheduler import JobCancelled
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_poll < self.interval:
+                return
+            self._last_poll = now
+        if (self.store.get(self.analysis_id) or {}).get("status") == "cancelled":
+            raise JobCancelled(self.analysis_id)
+
+
+@celery_app.task(name="geoai.run_analysis")
+def run_analysis_task(analysis_id: str, request_data: dict):
+    """Run one analysis and write its outcome to the shared analysis store"""
+    # Imported lazily so the API can import this module without a cycle
+    from main import AnalysisRequest, analysis_store, run_ai_analysis, run_profiled_analysis
+    from scheduler import JobCancelled
+
+    record = analysis_store.get(analysis_id) or {}
+    if record.get("status") == "cancelled":
+        logger.info(f"Skipping cancelled analysis {analysis_id}")
+        return {"analysis_id": analysis_id, "status": "cancelled"}
+
+    analysis_store.update(analysis_id, {"worker": os.getenv("HOSTNAME", "unknown")})
+    job = StoreCancellation(analysis_store, analysis_id)
+    request = AnalysisRequest(**request_data)
+    # Profile artifacts land in this worker's GEOAI_DATA_DIR, which the API must share
+    run = run_profiled_analysis if request.debug_profile else run_ai_analysis
+    try:
+        asyncio.run(run(analysis_id, request, job))
+    except JobCancelled:
+        logger.info(f"Stopped cancelled analysis {analysis_id}")
+    return {"analysis_id": analysis_id, "status": (analysis_store.get(analysis_id) or {}).get("status")}
+
+
+@task_failure.connect(sender=run_analysis_task)
+def mark_lost_analysis_failed(sender=None, task_id=None, exception=None, **kwargs):
+    """Record analyses whose worker process died; the task itself cannot"""
+    from billiard.exceptions import WorkerLostError
+
+    if not isinstance(exception, WorkerLostError):
+        return
+    from main import analysis_store
+
+    record = analysis_store.get(task_id) or {}
+    if record.get("status") == "processing":
+        logger.error(f"Worker lost while running analysis {task_id}: {exception}")
+        analysis_store.update(task_id, {
+            "status": "failed",
+            "error": f"Worker process died (likely out of memory): {exception}",
+            "completed_at": datetime.now().isoformat()
+        })
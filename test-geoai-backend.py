@@ -1,12 +1,30 @@
 #!/usr/bin/env python3
 
+import argparse
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
 import requests
 import json
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Test the GeoAI Python backend
 GEOAI_API_URL = "http://localhost:8001"
 
+# Regions used to vary load-test analysis requests
+LOAD_TEST_REGIONS = [
+    ("Nairobi", -1.2921, 36.8219),
+    ("Mombasa", -4.0435, 39.6682),
+    ("Kisumu", -0.0917, 34.7680),
+    ("Nakuru", -0.3031, 36.0800),
+    ("Eldoret", 0.5204, 35.2699)
+]
+
 def test_backend_health():
     """Test if the backend is running"""
     try:
@@ -82,7 +100,7 @@ def test_analysis_request():
             data = response.json()
             print("✅ Analysis started successfully!")
             print(f"Analysis ID: {data['analysis_id']}")
-            print(f"Status: {data['status']}")
+            print(f"Status: {data['results'].get('status', 'unknown')}")
             return data['analysis_id']
         else:
             print(f"❌ Failed to start analysis: {response.status_code}")
@@ -113,7 +131,175 @@ def test_analysis_results(analysis_id):
         print(f"❌ Error testing analysis results: {e}")
         return False
 
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class LoadTestRecorder:
+    """Thread-safe latency and status collection per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, latency_s, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency_s)
+            self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed_s):
+        print(f"{'Endpoint':<28}{'Reqs':>7}{'RPS':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  Statuses")
+        total = 0
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            total += len(values)
+            statuses = ", ".join(f"{code}: {n}" for code, n in sorted(self.statuses[endpoint].items(), key=str))
+            print(
+                f"{endpoint:<28}{len(values):>7}{len(values) / elapsed_s:>9.1f}"
+                f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+                f"{percentile(values, 99) * 1000:>10.1f}  {statuses}"
+            )
+        print(f"\nTotal: {total} requests in {elapsed_s:.1f}s ({total / elapsed_s:.1f} req/s)")
+
+def load_test_worker(base_url, recorder, deadline, remaining, remaining_lock, unique_analyses, profile_every):
+    """One simulated client issuing a mix of dashboard requests"""
+    session = requests.Session()
+    analysis_ids = []
+    # Analysis requests only, so --profile-every N profiles every Nth analysis
+    analyses_sent = 0
+    while time.time() < deadline:
+        with remaining_lock:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        
+        roll = random.random()
+        if roll < 0.3:
+            region, latitude, longitude = random.choice(LOAD_TEST_REGIONS)
+            payload = {
+                "region_name": region,
+                "latitude": latitude,
+                "longitude": longitude,
+                "radius_km": 5.0,
+                "start_date": "2024-01-01",
+                "end_date": "2024-01-31",
+                "analysis_type": random.choice(["vegetation_health", "drought_monitoring", "water_body_detection"]),
+                "satellite_source": "sentinel-2"
+            }
+            if unique_analyses:
+                # Nudge coordinates so requests do not coalesce
+                payload["latitude"] += random.uniform(-0.01, 0.01)
+            analyses_sent += 1
+            if profile_every and analyses_sent % profile_every == 0:
+                payload["debug_profile"] = True
+            method, endpoint, path = "POST", "POST /analyze", "/analyze"
+        elif roll < 0.5 and analysis_ids:
+            method, endpoint, path = "GET", "GET /analysis/{id}", f"/analysis/{random.choice(analysis_ids)}"
+        elif roll < 0.7:
+            method, endpoint, path = "GET", "GET /analysis-types", "/analysis-types"
+        elif roll < 0.85:
+            method, endpoint, path = "GET", "GET /regions/kenya", "/regions/kenya"
+        elif roll < 0.95:
+            method, endpoint, path = "GET", "GET /health", "/health"
+        else:
+            method, endpoint, path = "GET", "GET /stats", "/stats"
+        
+        started = time.perf_counter()
+        try:
+            if method == "POST":
+                response = session.post(f"{base_url}{path}", json=payload, timeout=60)
+            else:
+                response = session.get(f"{base_url}{path}", timeout=60)
+            status = response.status_code
+            if method == "POST" and status == 200:
+                analysis_ids.append(response.json()["analysis_id"])
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        recorder.record(endpoint, time.perf_counter() - started, status)
+
+def start_local_server(port):
+    """Start uvicorn for services/geoai-api and wait until / answers"""
+    api_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "services", "geoai-api")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=api_dir
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        if server.poll() is not None:
+            raise RuntimeError("Local server exited during startup")
+        try:
+            # / answers once the app is up; /health depends on the optional GeoAI instance
+            if requests.get(f"{base_url}/", timeout=1).status_code == 200:
+                return server, base_url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Local server did not start answering in 60 seconds")
+
+def run_load_test(args):
+    server = None
+    base_url = args.url
+    if args.start_server:
+        print(f"🚀 Starting local server on port {args.port}...")
+        server, base_url = start_local_server(args.port)
+    
+    try:
+        print(f"🔥 Load testing {base_url}: {args.concurrency} clients, "
+              f"{args.requests} requests max, {args.duration}s max")
+        recorder = LoadTestRecorder()
+        remaining = [args.requests]
+        remaining_lock = threading.Lock()
+        deadline = time.time() + args.duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for _ in range(args.concurrency):
+                pool.submit(
+                    load_test_worker, base_url, recorder, deadline, remaining, remaining_lock,
+                    args.unique_analyses, args.profile_every
+                )
+        elapsed = time.perf_counter() - started
+        
+        print("\n" + "=" * 50)
+        recorder.report(elapsed)
+        try:
+            print(f"\nServer stats: {json.dumps(requests.get(f'{base_url}/stats', timeout=5).json(), indent=2)}")
+        except requests.exceptions.RequestException:
+            pass
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test or load test the GeoAI Python backend")
+    parser.add_argument("--url", default=GEOAI_API_URL, help="Backend base URL")
+    parser.add_argument("--load", action="store_true", help="Run the concurrent load generator")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="Total request budget")
+    parser.add_argument("--duration", type=float, default=60.0, help="Maximum run time in seconds")
+    parser.add_argument("--unique-analyses", action="store_true",
+                        help="Vary analysis requests so they are not coalesced")
+    parser.add_argument("--profile-every", type=int, default=0,
+                        help="Send debug_profile on every Nth analysis request per client")
+    parser.add_argument("--start-server", action="store_true", help="Start a local uvicorn server first")
+    parser.add_argument("--port", type=int, default=8011, help="Port for --start-server")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.load:
+        run_load_test(args)
+        return
+    
+    global GEOAI_API_URL
+    GEOAI_API_URL = args.url
+    
     print("🧪 Testing GeoAI Python Backend...")
     print("=" * 50)
     